@@ -0,0 +1,115 @@
+"""Micro-benchmark: single-pass lxml product extraction vs. the previous two-pass BeautifulSoup path.
+
+Both rows time what one pipeline run costs per page: the scraped fields plus the image lookup. The bs4 path
+parsed each page twice for that; the pipeline now reads both from one memoized extract_product parse.
+
+Save the product pages of the article list once, then benchmark offline:
+    python benchmark_extraction.py --download
+    python benchmark_extraction.py --repeat 50
+"""
+import os
+import sys
+import time
+import glob
+import argparse
+import hashlib
+import requests
+from bs4 import BeautifulSoup
+
+from newsletter_multi_agent import extract_product
+
+PAGES_DIR = "benchmark_pages"
+ARTICLE_LIST = "Artikelliste_Newsletter.txt"
+
+# --- Previous implementation (two html.parser parses per page) ---
+def legacy_scrape(html: str) -> dict:
+    soup = BeautifulSoup(html, "html.parser")
+    desc_div = soup.select_one("div[itemprop='description']")
+    price_p = soup.select_one(".product-detail-price")
+    unit_span = soup.select_one(".price-unit-content")
+    ref_span = soup.select_one(".price-unit-reference-content")
+    return {
+        "description": desc_div.get_text(separator='\\n', strip=True) if desc_div else "N/A",
+        "price": price_p.get_text(strip=True) if price_p else "N/A",
+        "unit_content": unit_span.get_text(strip=True) if unit_span else "N/A",
+        "price_per_unit": ref_span.get_text(strip=True) if ref_span else "N/A",
+    }
+
+def legacy_image_url(html: str, article_url: str):
+    soup = BeautifulSoup(html, "html.parser")
+    meta = soup.find("meta", property="og:image")
+    if meta and meta.get("content"): return meta["content"]
+    img = soup.select_one(".product--image-container img, div.image-slider--item img")
+    if img and "src" in img.attrs:
+        url = img["src"]
+        if url.startswith("//"): return "https:" + url
+        if url.startswith("/"): return f"{article_url.split('/')[0]}//{article_url.split('/')[2]}{url}"
+        return url
+    return None
+
+# --- Current implementation (one parse per page, shared by the scraper and the image tool) ---
+def pipeline_scrape_and_image_url(html: str, url: str) -> tuple[dict, str | None]:
+    record = extract_product(html, url)
+    return record.to_scraped_dict(), record.image_url
+
+# --- Benchmark ---
+def download_pages(article_list: str, pages_dir: str):
+    """Saves every product page of the article list as <sha1>.html plus a .url sidecar."""
+    os.makedirs(pages_dir, exist_ok=True)
+    with open(article_list, "r", encoding="utf-8") as f:
+        urls = [line.strip() for line in f if line.strip()]
+    with requests.Session() as session:
+        for url in urls:
+            r = session.get(url, timeout=20); r.raise_for_status()
+            base = os.path.join(pages_dir, hashlib.sha1(url.encode("utf-8")).hexdigest())
+            with open(base + ".html", "w", encoding="utf-8") as f:
+                f.write(r.text)
+            with open(base + ".url", "w", encoding="utf-8") as f:
+                f.write(url)
+            print(f"  -> Saved {url} ({len(r.content) / 1024:.0f} KB)")
+
+def load_pages(pages_dir: str) -> list[tuple[str, str]]:
+    pages = []
+    for path in sorted(glob.glob(os.path.join(pages_dir, "*.html"))):
+        url_path = os.path.splitext(path)[0] + ".url"
+        url = open(url_path, encoding="utf-8").read().strip() if os.path.exists(url_path) else "https://www.amadoro.de/"
+        with open(path, "r", encoding="utf-8") as f:
+            pages.append((url, f.read()))
+    return pages
+
+def bench(label: str, func, pages: list, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for url, html in pages:
+            func(html, url)
+    per_page_ms = (time.perf_counter() - start) * 1000 / (repeat * len(pages))
+    print(f"{label:<40} {per_page_ms:8.2f} ms/page")
+    return per_page_ms
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", default=PAGES_DIR, help="directory with saved product pages")
+    parser.add_argument("--download", action="store_true", help=f"download the pages listed in {ARTICLE_LIST} first")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.download:
+        download_pages(ARTICLE_LIST, args.pages)
+    pages = load_pages(args.pages)
+    if not pages:
+        sys.exit(f"No saved pages in {args.pages}/ - run with --download first.")
+
+    mismatches = 0
+    for url, html in pages:
+        record = extract_product(html, url)
+        if record.to_scraped_dict() != legacy_scrape(html) or record.image_url != legacy_image_url(html, url):
+            mismatches += 1
+            print(f"  -> Output differs from the bs4 path for {url}")
+    print(f"Benchmarking {len(pages)} pages x {args.repeat} rounds ({mismatches} mismatches)\n")
+
+    legacy = bench("bs4 html.parser (scrape + image lookup)", lambda html, url: (legacy_scrape(html), legacy_image_url(html, url)), pages, args.repeat)
+    single = bench("lxml single pass (scrape + image lookup)", pipeline_scrape_and_image_url, pages, args.repeat)
+    print(f"\nSpeed-up: {legacy / single:.1f}x")
+
+if __name__ == "__main__":
+    main()
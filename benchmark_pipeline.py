@@ -0,0 +1,246 @@
+"""Offline scaling benchmark for the newsletter pipeline.
+
+Runs everything against local stand-ins - a shop serving synthetic amadoro-style product pages and images,
+the Shopware API stand-in (shopware_standin.py) for the uploads, and a stub model that replays recorded
+writer responses - and reports throughput and peak memory per stage, plus the startup time of the script:
+
+    python benchmark_pipeline.py                            # 7, 100 and 1000 articles
+    python benchmark_pipeline.py --articles 100 --latency-ms 30 --output baseline.json
+
+Peak memory is the tracemalloc peak of this process (Python allocations; the image resize workers are
+separate processes and listed as "child RSS" where the platform reports it).
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import threading
+import tracemalloc
+from io import BytesIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PIL import Image
+
+from shopware_standin import start_standin_server
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCALES = [7, 100, 1000]
+IMAGE_VARIANTS = 8
+IMAGE_SIZE = (1200, 1200)
+
+# --- Synthetic Shop ---
+_FILLER = "".join(f'<li class="navigation--entry"><a class="navigation--link" href="/kategorie-{i}" title="Kategorie {i}">Kategorie {i}</a></li>' for i in range(400))
+
+PRODUCT_PAGE = """<!DOCTYPE html>
+<html lang="de"><head><meta charset="utf-8"><title>Artikel {n} | Amadoro</title>
+<meta property="og:image" content="{base}/media/product_{run}_{n}.jpg"></head>
+<body><nav><ul class="navigation--list">{filler}</ul></nav>
+<div class="product-detail-buy"><p class="product-detail-price">{price},90&nbsp;€*</p>
+<span class="price-unit-content">0,75 Liter</span><span class="price-unit-reference-content">({price},87 € / 1 Liter)</span></div>
+<div class="product-detail-description"><div itemprop="description">
+<h2>Artikel {n}</h2><p>Ein fruchtiger Rotwein mit Aromen von Kirsche und Brombeere, ausgebaut im Barrique.</p>
+<ul><li>Rebsorte: Merlot</li><li>Alkohol: 13,5 % vol.</li><li>Enthält Sulfite</li></ul></div></div>
+<footer><ul>{filler}</ul></footer></body></html>"""
+
+def make_images(count: int = IMAGE_VARIANTS, size: tuple[int, int] = IMAGE_SIZE) -> list[bytes]:
+    """Noisy product-photo sized JPEGs (a few hundred KB each), so downloads and resizes cost what real ones do."""
+    images = []
+    for i in range(count):
+        noise = Image.effect_noise(size, 40 + i * 5)
+        image = Image.merge("RGB", (noise, noise.rotate(90), noise.rotate(180)))
+        buffer = BytesIO()
+        image.save(buffer, "JPEG", quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+def start_shop_server(images: list[bytes], latency: float = 0.0) -> tuple[ThreadingHTTPServer, str]:
+    """Serves /<run>/detail/<n> product pages and /media/product_<run>_<n>.jpg images on a background thread."""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if latency:
+                time.sleep(latency)
+            parts = self.path.strip("/").split("/")
+            if len(parts) == 3 and parts[1] == "detail":
+                body = PRODUCT_PAGE.format(base=base_url, run=parts[0], n=parts[2], price=5 + int(parts[2]) % 40, filler=_FILLER).encode("utf-8")
+                content_type = "text/html; charset=utf-8"
+            elif len(parts) == 2 and parts[0] == "media" and parts[1].endswith(".jpg"):
+                body = images[int(parts[1].rsplit("_", 1)[1][:-4]) % len(images)]
+                content_type = "image/jpeg"
+            else:
+                body, content_type = b"Not found", "text/plain"
+            self.send_response(200 if content_type != "text/plain" else 404)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, base_url
+
+# --- Replay Model ---
+def make_replay_llm(responses: list[dict], latency: float = 0.0):
+    """Returns a stub model that answers the n-th model turn of a conversation with the n-th recorded response."""
+    from google.adk.models.base_llm import BaseLlm
+    from google.adk.models.llm_response import LlmResponse
+
+    class ReplayLlm(BaseLlm):
+        recorded: list[dict]
+        latency: float = 0.0
+
+        async def generate_content_async(self, llm_request, stream: bool = False):
+            turn = sum(1 for content in llm_request.contents if content.role == "model")
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            yield LlmResponse.model_validate(self.recorded[min(turn, len(self.recorded) - 1)])
+
+    return ReplayLlm(model="replay", recorded=responses, latency=latency)
+
+# Mentions a price, which the price validation must leave alone.
+TEASER = "Fruchtig, rund und ideal zum Abendessen. Im 6er-Karton für nur 69,00 EUR!"
+
+def writer_recording(urls: list[str], scraped_texts_filename: str, image_urls_filename: str) -> list[dict]:
+    """The writer's turns for `urls`: look up the articles, save the copy, confirm."""
+    copy = {
+        "intro": "heute stellen wir Ihnen unsere neuen Weine vor.",
+        "outro": "Ich wünsche Ihnen eine schöne Woche mit viel Genuss,",
+        "articles": [{"url": url, "headline": f"Artikel {i}", "teaser": TEASER, "price_label": "je Flasche", "vat": "19%"} for i, url in enumerate(urls)],
+    }
+    usage = {"prompt_token_count": 2000 + 150 * len(urls), "candidates_token_count": 60 * len(urls), "total_token_count": 2000 + 210 * len(urls)}
+    def call(name, args):
+        return {"content": {"role": "model", "parts": [{"function_call": {"name": name, "args": args}}]}, "usage_metadata": usage}
+    return [
+        call("get_articles_needing_copy", {"scraped_texts_filename": scraped_texts_filename}),
+        call("save_newsletter_from_copy", {"copy_json": json.dumps(copy, ensure_ascii=False), "scraped_texts_filename": scraped_texts_filename, "image_urls_filename": image_urls_filename}),
+        {"content": {"role": "model", "parts": [{"text": "Der Newsletter wurde gespeichert."}]}, "usage_metadata": usage},
+    ]
+
+# --- Output Checks ---
+# Email constructs minify_html must keep intact: (input, minified).
+MINIFY_CASES = [
+    ("<!--[if !mso]><!--> <p>Visible</p> <!--<![endif]-->", "<!--[if !mso]><!--><p>Visible</p><!--<![endif]-->"),
+    ("<!--[if mso]>\n<table><tr><td>\n<![endif]--> <p>x</p>", "<!--[if mso]><table><tr><td><![endif]--><p>x</p>"),
+    ("<style><!--\n  p { margin: 0 }\n--></style> <!-- note --> <p> a  b </p>", "<style><!--\n  p { margin: 0 }\n--></style><p>a b</p>"),
+    ("<pre>  keep\n  this </pre>", "<pre>  keep\n  this </pre>"),
+]
+
+def check_minify(minify_html):
+    """Exits if minify_html changes how one of MINIFY_CASES renders."""
+    for html, expected in MINIFY_CASES:
+        if minify_html(html) != expected:
+            sys.exit(f"minify_html({html!r}) returned {minify_html(html)!r}, expected {expected!r}")
+
+# --- Benchmark ---
+STARTUP_SNIPPETS = {
+    "python": "pass",
+    "import newsletter_multi_agent": "import newsletter_multi_agent",
+    "import + build writer agent": "import newsletter_multi_agent as pipeline; pipeline.get_writer_agent()",
+}
+
+def measure_startup(repeat: int = 3) -> dict:
+    """Best-of-`repeat` wall time of fresh interpreters running each startup snippet (the first one is the baseline)."""
+    timings = {}
+    for label, code in STARTUP_SNIPPETS.items():
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], check=True, stdout=subprocess.DEVNULL, cwd=os.path.dirname(os.path.abspath(__file__)))
+            runs.append(time.perf_counter() - start)
+        timings[label] = round(min(runs), 3)
+        print(f"{'startup: ' + label:<40} {timings[label]:9.2f}s")
+    return timings
+
+def measure(label: str, count: int, func, use_tracemalloc: bool = True) -> dict:
+    """Runs func() in a fresh working directory and returns its timing and peak memory."""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        if use_tracemalloc:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            func()
+        finally:
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] if use_tracemalloc else 0
+            tracemalloc.stop()
+            os.chdir(cwd)
+    result = {"stage": label, "articles": count, "seconds": round(elapsed, 3), "articles_per_second": round(count / elapsed, 2), "peak_mb": round(peak / 2**20, 1)}
+    if resource is not None:
+        # ru_maxrss is in KB on Linux (bytes on macOS); the high-water mark over all reaped children so far.
+        result["child_rss_mb"] = round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+    print(f"{label:<32} {count:6d} articles {elapsed:9.2f}s {result['articles_per_second']:9.1f} articles/s {result['peak_mb']:9.1f} MB peak")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, nargs="+", default=SCALES, help="article counts to benchmark")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated latency per shop and API request")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="simulated latency per model call")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="time without tracemalloc (no peak memory)")
+    parser.add_argument("--output", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    startup = measure_startup()
+    latency = args.latency_ms / 1000
+    print("Generating synthetic images...")
+    shop_server, shop_url = start_shop_server(make_images(), latency)
+    api_server, store = start_standin_server(latency=latency)
+
+    # The pipeline reads its upload settings at import time, so point it at the stand-ins before importing it.
+    os.environ.update({"SHOPWARE_URL": store.base_url, "NEWSLETTER_UPLOAD_BACKEND": "api", "NEWSLETTER_PAGE_CACHE_DIR": os.path.join(tempfile.mkdtemp(), "page_cache")})
+    import newsletter_multi_agent as pipeline
+    if pipeline.SHOPWARE_URL != store.base_url:
+        sys.exit("SHOPWARE_URL is overridden by the .env file - remove it there to run the benchmark offline.")
+    check_minify(pipeline.minify_html)
+
+    results = []
+    use_tracemalloc = not args.no_tracemalloc
+    for count in args.articles:
+        # Every stage gets its own URLs, so the page cache and the upload manifest start cold.
+        def urls(run):
+            return [f"{shop_url}/{run}-{count}/detail/{n}" for n in range(count)]
+
+        results.append(measure("get_and_save_all_article_texts", count, lambda: pipeline.get_and_save_all_article_texts(urls("scrape")), use_tracemalloc))
+        results.append(measure("process_images_from_urls", count, lambda: pipeline.process_images_from_urls(urls("images")), use_tracemalloc))
+
+        def full_pipeline():
+            article_urls = urls("pipeline")
+            recording = writer_recording(article_urls, pipeline.SCRAPED_TEXTS_FILENAME, pipeline.IMAGE_URLS_FILENAME)
+            writer = pipeline.get_writer_agent().model_copy(update={"model": make_replay_llm(recording, args.llm_latency_ms / 1000)})
+            asyncio.run(pipeline.run_pipeline_direct(article_urls, writer=writer))
+            if not os.path.exists(pipeline.newsletter_filename()):
+                raise RuntimeError("The pipeline did not write a newsletter.")
+            with open(pipeline.newsletter_filename(), "r", encoding="utf-8") as f:
+                if f.read().count(TEASER) != count:
+                    raise RuntimeError("The saved newsletter does not contain the writer's copy unchanged.")
+        results.append(measure("full pipeline (direct mode)", count, full_pipeline, use_tracemalloc))
+
+    shop_server.shutdown()
+    api_server.shutdown()
+    print("\n--- Summary ---")
+    for label, seconds in startup.items():
+        print(f"{'startup: ' + label:<40} {seconds:9.2f}s")
+    for result in results:
+        print(f"{result['stage']:<32} {result['articles']:6d} articles {result['seconds']:9.2f}s {result['articles_per_second']:9.1f} articles/s {result['peak_mb']:9.1f} MB peak")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"latency_ms": args.latency_ms, "llm_latency_ms": args.llm_latency_ms, "startup_seconds": startup, "results": results}, f, indent=2)
+        print(f"✅ Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
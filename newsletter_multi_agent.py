@@ -3,12 +3,28 @@ import asyncio
 import re
 import datetime
 import json
+import argparse
+import hashlib
+import threading
+import time
+import uuid
+import mimetypes
+import inspect
+import functools
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+from dataclasses import dataclass
+from html import escape
+from string import Template
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from urllib.parse import urlsplit
 from dotenv import load_dotenv
 import requests
-from bs4 import BeautifulSoup
-from PIL import Image
+from requests.adapters import HTTPAdapter
+import lxml.html
+from lxml import etree
 from io import BytesIO
-from playwright.async_api import async_playwright
 
 # --- Environment Setup ---
 dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
@@ -16,15 +32,402 @@ load_dotenv(dotenv_path=dotenv_path, override=True)
 print(f"INFO:     Lade .env-Datei von: {dotenv_path} (mit override=True)")
 
 # --- ADK Imports ---
-from google.adk.agents import LlmAgent
-from google.adk.models.google_llm import Gemini
-from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
-from google.adk.tools import AgentTool
-from google.genai import types
-print("✅ ADK components imported successfully.")
+# google.adk, google.genai, Pillow and Playwright take seconds to import; they are imported where they are
+# first needed, so commands that only scrape (or only write) do not pay for the rest.
+if TYPE_CHECKING:
+    from google.adk.agents import LlmAgent
+
+# --- Run Instrumentation ---
+TRACE_DIR = os.getenv("NEWSLETTER_TRACE_DIR", "run_traces")
+PROFILE_STAGES = {name.strip() for name in os.getenv("NEWSLETTER_PROFILE", "").split(",") if name.strip()}
+
+class RunTrace:
+    """Collects the tool timings, HTTP traffic and LLM calls of one run and writes them to a JSON trace.
+
+    Stages listed in NEWSLETTER_PROFILE (tool names, or "all") are additionally run under cProfile; their
+    stats are dumped next to the trace.
+    """
+
+    def __init__(self):
+        self.run_id = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.info = {}
+        self.tools = []
+        self.http = {}
+        self.llm_calls = []
+        self._llm_started = {}
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._cpu_start = time.process_time()
+
+    @contextmanager
+    def measure(self, name: str):
+        """Records wall-clock and CPU time (own and of reaped worker processes) of the enclosed block."""
+        entry = {"name": name, "started_at": round(time.perf_counter() - self._start, 3), "status": "ok"}
+        profiler = None
+        if name in PROFILE_STAGES or "all" in PROFILE_STAGES:
+            import cProfile
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Only one profiler can be active at a time (e.g. when profiled stages overlap).
+                profiler = None
+        wall, cpu, times = time.perf_counter(), time.process_time(), os.times()
+        try:
+            yield entry
+        except BaseException as e:
+            entry["status"] = f"error: {e}"
+            raise
+        finally:
+            end_times = os.times()
+            entry["wall_seconds"] = round(time.perf_counter() - wall, 3)
+            entry["cpu_seconds"] = round(time.process_time() - cpu, 3)
+            entry["child_cpu_seconds"] = round((end_times.children_user - times.children_user) + (end_times.children_system - times.children_system), 3)
+            if profiler is not None:
+                profiler.disable()
+                os.makedirs(TRACE_DIR, exist_ok=True)
+                entry["profile"] = os.path.join(TRACE_DIR, f"run_{self.run_id}_{name}.prof")
+                profiler.dump_stats(entry["profile"])
+            with self._lock:
+                self.tools.append(entry)
+
+    def record_http(self, response: requests.Response, *args, **kwargs):
+        """requests response hook: counts requests and bytes per host."""
+        host = urlsplit(response.url).netloc
+        body = response.request.body
+        with self._lock:
+            stats = self.http.setdefault(host, {"requests": 0, "bytes_sent": 0, "bytes_received": 0})
+            stats["requests"] += 1
+            stats["bytes_sent"] += len(body) if isinstance(body, (bytes, str)) else 0
+            stats["bytes_received"] += len(response.content)
+
+    def llm_started(self, callback_context, llm_request):
+        """before_model_callback of the agents."""
+        self._llm_started[(callback_context.invocation_id, callback_context.agent_name)] = time.perf_counter()
+
+    def llm_finished(self, callback_context, llm_response):
+        """after_model_callback of the agents: records latency and token usage of the model call."""
+        if getattr(llm_response, "partial", False):
+            return None
+        started = self._llm_started.pop((callback_context.invocation_id, callback_context.agent_name), None)
+        usage = llm_response.usage_metadata
+        with self._lock:
+            self.llm_calls.append({
+                "agent": callback_context.agent_name,
+                "latency_seconds": round(time.perf_counter() - started, 3) if started else None,
+                "prompt_tokens": getattr(usage, "prompt_token_count", None) or 0,
+                "output_tokens": getattr(usage, "candidates_token_count", None) or 0,
+                "thoughts_tokens": getattr(usage, "thoughts_token_count", None) or 0,
+                "total_tokens": getattr(usage, "total_token_count", None) or 0,
+            })
+        return None
+
+    def to_dict(self) -> dict:
+        llm_totals = {key: sum(call[key] for call in self.llm_calls) for key in ("prompt_tokens", "output_tokens", "thoughts_tokens", "total_tokens")}
+        llm_totals["calls"] = len(self.llm_calls)
+        llm_totals["latency_seconds"] = round(sum(call["latency_seconds"] or 0 for call in self.llm_calls), 3)
+        return {
+            "run_id": self.run_id,
+            **self.info,
+            "wall_seconds": round(time.perf_counter() - self._start, 3),
+            "cpu_seconds": round(time.process_time() - self._cpu_start, 3),
+            "tools": self.tools,
+            "http": self.http,
+            "llm": {"totals": llm_totals, "calls": self.llm_calls},
+        }
+
+    def write(self, directory: str = TRACE_DIR) -> str:
+        """Writes the trace to <directory>/run_<timestamp>.json, prints a short summary and returns the path."""
+        trace = self.to_dict()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"run_{self.run_id}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(trace, f, ensure_ascii=False, indent=2)
+        print("\n--- Run Trace ---")
+        for tool in trace["tools"]:
+            print(f"  {tool['name']:<34} {tool['wall_seconds']:8.2f}s wall {tool['cpu_seconds']:8.2f}s CPU  {tool['status']}")
+        for host, stats in trace["http"].items():
+            print(f"  HTTP {host:<29} {stats['requests']:5d} requests {stats['bytes_received'] / 1024:10.0f} KB in {stats['bytes_sent'] / 1024:8.0f} KB out")
+        llm = trace["llm"]["totals"]
+        print(f"  LLM  {llm['calls']} calls, {llm['latency_seconds']:.2f}s, {llm['prompt_tokens']} prompt + {llm['output_tokens']} output tokens")
+        print(f"✅ Run trace saved to {path} (total {trace['wall_seconds']:.2f}s)")
+        return path
+
+run_trace = RunTrace()
+
+def traced(func):
+    """Decorator for the tool functions: records each call in the run trace (keeps the signature for ADK)."""
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            with run_trace.measure(func.__name__) as entry:
+                result = await func(*args, **kwargs)
+                if isinstance(result, str) and result.startswith("Error"):
+                    entry["status"] = result
+                return result
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with run_trace.measure(func.__name__) as entry:
+            result = func(*args, **kwargs)
+            if isinstance(result, str) and result.startswith("Error"):
+                entry["status"] = result
+            return result
+    return wrapper
+
+# --- HTTP Fetch Engine ---
+HTTP_CONCURRENCY = int(os.getenv("NEWSLETTER_HTTP_CONCURRENCY", "8"))
+HTTP_TIMEOUT = float(os.getenv("NEWSLETTER_HTTP_TIMEOUT", "20"))
+_http_sessions = {}
+_http_sessions_lock = threading.Lock()
+
+def get_http_session(url: str) -> requests.Session:
+    """Returns the shared keep-alive session for the host of `url` (one connection pool per host)."""
+    host = urlsplit(url).netloc
+    with _http_sessions_lock:
+        session = _http_sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            session.hooks["response"].append(run_trace.record_http)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(HTTP_CONCURRENCY, 1))
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _http_sessions[host] = session
+        return session
+
+def http_get(url: str, timeout: float = HTTP_TIMEOUT, **kwargs) -> requests.Response:
+    """GET via the pooled session of the host, with a per-request timeout. Raises on HTTP errors."""
+    response = get_http_session(url).get(url, timeout=timeout, **kwargs)
+    response.raise_for_status()
+    return response
+
+def fetch_all(urls: list[str], fetch, max_workers: int = HTTP_CONCURRENCY) -> list:
+    """Runs `fetch(url)` for all URLs on a bounded thread pool.
+
+    Results are returned in input order; a failing URL yields the raised exception instead of a result.
+    """
+    def run(url):
+        try:
+            return fetch(url)
+        except Exception as e:
+            return e
+    if max_workers <= 1 or len(urls) <= 1:
+        return [run(url) for url in urls]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as pool:
+        return list(pool.map(run, urls))
+
+# --- Page Cache ---
+PAGE_CACHE_DIR = os.getenv("NEWSLETTER_PAGE_CACHE_DIR", ".page_cache")
+PAGE_CACHE_TTL = float(os.getenv("NEWSLETTER_PAGE_CACHE_TTL", str(6 * 3600)))
+PAGE_CACHE_MAX_BYTES = int(float(os.getenv("NEWSLETTER_PAGE_CACHE_MAX_MB", "200")) * 1024 * 1024)
+
+class PageCache:
+    """On-disk cache for product pages, shared by the scraping and the image tools.
+
+    Bodies are stored together with their ETag/Last-Modified validators. Entries younger than `ttl` seconds
+    are served without touching the network, older ones are revalidated with a conditional GET. Once the
+    cache grows beyond `max_bytes`, the least recently used entries are evicted. The product extracted from
+    a body is kept in memory, so each page is parsed once per run however many tools read it.
+    """
+
+    def __init__(self, directory: str = PAGE_CACHE_DIR, ttl: float = PAGE_CACHE_TTL, max_bytes: int = PAGE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._url_locks = {}
+        self._total_bytes = None
+        self._products = {}
+
+    def _paths(self, url: str) -> tuple[str, str]:
+        base = os.path.join(self.directory, hashlib.sha256(url.encode("utf-8")).hexdigest())
+        return base + ".html", base + ".json"
+
+    def _url_lock(self, url: str) -> threading.Lock:
+        # Concurrent requests for the same URL wait for the first one instead of hitting the network twice.
+        with self._lock:
+            return self._url_locks.setdefault(url, threading.Lock())
+
+    @staticmethod
+    def _write_atomic(path: str, data: str):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _load(self, url: str):
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "r", encoding="utf-8") as f:
+                return meta, f.read()
+        except (OSError, ValueError):
+            return None, None
+
+    def _save(self, url: str, meta: dict, body: str | None = None):
+        os.makedirs(self.directory, exist_ok=True)
+        body_path, meta_path = self._paths(url)
+        old_size = 0
+        if body is not None:
+            old_size = os.path.getsize(body_path) if os.path.exists(body_path) else 0
+            self._write_atomic(body_path, body)
+            meta["size"] = os.path.getsize(body_path)
+        self._write_atomic(meta_path, json.dumps(meta, ensure_ascii=False))
+        return old_size
+
+    def _scan(self) -> list:
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                entries.append((meta.get("used_at", 0), meta.get("size", 0), name[:-len(".json")]))
+            except (OSError, ValueError):
+                continue
+        return entries
+
+    def _account(self, added_bytes: int):
+        # A full directory scan only happens once per process and whenever the size bound is exceeded.
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._scan())
+            else:
+                self._total_bytes += added_bytes
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = self._scan()
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for ext in (".html", ".json"):
+                try:
+                    os.remove(os.path.join(self.directory, key + ext))
+                except OSError:
+                    pass
+            total -= size
+        self._total_bytes = total
+
+    def get(self, url: str, timeout: float = HTTP_TIMEOUT) -> str:
+        """Returns the body of `url`, doing at most one (conditional) request."""
+        with self._url_lock(url):
+            meta, body = self._load(url)
+            now = time.time()
+            if meta and now - meta["fetched_at"] < self.ttl:
+                meta["used_at"] = now
+                self._save(url, meta)
+                return body
+
+            headers = {}
+            if meta and meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta and meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+            response = get_http_session(url).get(url, headers=headers, timeout=timeout)
+            if response.status_code == 304 and meta:
+                meta["fetched_at"] = meta["used_at"] = now
+                self._save(url, meta)
+                return body
+            response.raise_for_status()
+
+            body = response.text
+            meta = {
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "fetched_at": now,
+                "used_at": now,
+            }
+            old_size = self._save(url, meta, body)
+        self._account(meta["size"] - old_size)
+        return body
+
+    def get_product(self, url: str, timeout: float = HTTP_TIMEOUT) -> "ProductRecord":
+        """Returns the product extracted from the current body of `url`, parsing each body only once."""
+        body = self.get(url, timeout=timeout)
+        key = (url, hashlib.sha1(body.encode("utf-8")).digest())
+        # Holding the URL lock makes a concurrent reader of the same page wait for this parse instead of repeating it.
+        with self._url_lock(url):
+            record = self._products.get(key)
+            if record is None:
+                record = self._products[key] = extract_product(body, url)
+        return record
+
+page_cache = PageCache()
+
+def fetch_page(url: str, timeout: float = HTTP_TIMEOUT) -> str:
+    """Returns the HTML of a product page through the shared on-disk page cache."""
+    return page_cache.get(url, timeout=timeout)
+
+def fetch_product(url: str, timeout: float = HTTP_TIMEOUT) -> "ProductRecord":
+    """Returns the extracted product page through the page cache (parsed once per run for all tools)."""
+    return page_cache.get_product(url, timeout=timeout)
+
+# --- Product Extraction ---
+@dataclass(slots=True)
+class ProductRecord:
+    """Everything the newsletter needs from one product page."""
+    description: str = "N/A"
+    price: str = "N/A"
+    unit_content: str = "N/A"
+    price_per_unit: str = "N/A"
+    image_url: str | None = None
+
+    def to_scraped_dict(self) -> dict:
+        """Returns the per-article fields stored in scraped_texts.json."""
+        return {"description": self.description, "price": self.price, "unit_content": self.unit_content, "price_per_unit": self.price_per_unit}
+
+def _has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+_XP_DESCRIPTION = etree.XPath("(//div[@itemprop='description'])[1]")
+_XP_PRICE = etree.XPath(f"(//*[{_has_class('product-detail-price')}])[1]")
+_XP_UNIT_CONTENT = etree.XPath(f"(//*[{_has_class('price-unit-content')}])[1]")
+_XP_PRICE_PER_UNIT = etree.XPath(f"(//*[{_has_class('price-unit-reference-content')}])[1]")
+_XP_OG_IMAGE = etree.XPath("//meta[@property='og:image']/@content")
+_XP_FALLBACK_IMAGE = etree.XPath(f"(//*[{_has_class('product--image-container')}]//img[@src] | //div[{_has_class('image-slider--item')}]//img[@src])[1]/@src")
+_XP_TEXT = etree.XPath(".//text()[not(ancestor::script) and not(ancestor::style)]")
+
+def _element_text(elements: list, separator: str = "") -> str:
+    # Mirrors BeautifulSoup's get_text(separator=..., strip=True) that produced the previous scraped_texts.json.
+    if not elements:
+        return "N/A"
+    return separator.join(text for text in (t.strip() for t in _XP_TEXT(elements[0])) if text)
+
+def _absolute_url(src: str, page_url: str) -> str:
+    if src.startswith("//"): return "https:" + src
+    if src.startswith("/"): return f"{page_url.split('/')[0]}//{page_url.split('/')[2]}{src}"
+    return src
+
+def extract_product(html: str, page_url: str) -> ProductRecord:
+    """Parses a product page once (lxml) and pulls description, prices, units and the image URL from it."""
+    try:
+        doc = lxml.html.document_fromstring(html)
+    except ValueError:
+        # lxml refuses str input that carries an XML encoding declaration.
+        doc = lxml.html.document_fromstring(html.encode("utf-8"))
+
+    image_url = next((content for content in _XP_OG_IMAGE(doc) if content), None)
+    if image_url is None:
+        fallback = _XP_FALLBACK_IMAGE(doc)
+        image_url = _absolute_url(fallback[0], page_url) if fallback else None
+
+    return ProductRecord(
+        description=_element_text(_XP_DESCRIPTION(doc), separator='\\n'),
+        price=_element_text(_XP_PRICE(doc)),
+        unit_content=_element_text(_XP_UNIT_CONTENT(doc)),
+        price_per_unit=_element_text(_XP_PRICE_PER_UNIT(doc)),
+        image_url=image_url,
+    )
 
 # --- Tool Function Definitions ---
+@traced
 def read_file_content(filepath: str) -> str:
     """Reads the content of a specified file and returns it as a string."""
     print(f"TOOL CALLED: read_file_content(filepath='{filepath}')")
@@ -34,40 +437,21 @@ def read_file_content(filepath: str) -> str:
     except Exception as e:
         return f"Error reading file {filepath}: {e}"
 
-def get_and_save_all_article_texts(urls: list[str], output_filename: str = "scraped_texts.json") -> str:
-    """Scrapes structured data (description, price, etc.) from URLs and saves to a JSON file."""
-    print(f"TOOL CALLED: get_and_save_all_article_texts(..., output_filename='{output_filename}')")
-    scraped_data = {}
-    for url in urls:
+@traced
+def get_and_save_all_article_texts(urls: list[str], output_filename: str = "scraped_texts.json", max_workers: int = HTTP_CONCURRENCY, timeout: float = HTTP_TIMEOUT) -> str:
+    """Scrapes structured data (description, price, etc.) from URLs concurrently and saves to a JSON file."""
+    print(f"TOOL CALLED: get_and_save_all_article_texts(..., output_filename='{output_filename}', max_workers={max_workers})")
+    def scrape(url):
         print(f"  -> Scraping data from: {url}")
-        try:
-            response = requests.get(url)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, "html.parser")
-            
-            article_data = {}
-            
-            # Scrape description
-            desc_div = soup.select_one("div[itemprop='description']")
-            article_data['description'] = desc_div.get_text(separator='\\n', strip=True) if desc_div else "N/A"
-            
-            # Scrape price
-            price_p = soup.select_one(".product-detail-price")
-            article_data['price'] = price_p.get_text(strip=True) if price_p else "N/A"
-            
-            # Scrape unit content
-            unit_span = soup.select_one(".price-unit-content")
-            article_data['unit_content'] = unit_span.get_text(strip=True) if unit_span else "N/A"
-            
-            # Scrape price per unit
-            ref_span = soup.select_one(".price-unit-reference-content")
-            article_data['price_per_unit'] = ref_span.get_text(strip=True) if ref_span else "N/A"
-            
-            scraped_data[url] = article_data
-            
-        except Exception as e:
-            scraped_data[url] = {"error": f"Error fetching or parsing URL: {e}"}
-    
+        return fetch_product(url, timeout=timeout).to_scraped_dict()
+
+    scraped_data = {}
+    for url, result in zip(urls, fetch_all(urls, scrape, max_workers=max_workers)):
+        if isinstance(result, Exception):
+            scraped_data[url] = {"error": f"Error fetching or parsing URL: {result}"}
+        else:
+            scraped_data[url] = result
+
     try:
         with open(output_filename, "w", encoding="utf-8") as f:
             json.dump(scraped_data, f, ensure_ascii=False, indent=2)
@@ -76,149 +460,1397 @@ def get_and_save_all_article_texts(urls: list[str], output_filename: str = "scra
     except Exception as e:
         return f"Error saving data to file: {e}"
 
-def process_images_from_urls(urls: list[str]) -> list[str]:
+TARGET_HEIGHT = 300
+IMAGE_WORKERS = int(os.getenv("NEWSLETTER_IMAGE_WORKERS", str(os.cpu_count() or 1)))
+IMAGE_INDEX_FILENAME = "processed_images.json"
+# Email weight: each image is saved as progressive JPEG at the highest quality in the range that fits the
+# byte budget. NEWSLETTER_IMAGE_2X additionally saves a double-resolution variant (twice the budget), which
+# the newsletter then uses at the display size of the normal image.
+IMAGE_MAX_BYTES = int(float(os.getenv("NEWSLETTER_IMAGE_MAX_KB", "30")) * 1024)
+IMAGE_QUALITY_RANGE = (int(os.getenv("NEWSLETTER_IMAGE_MIN_QUALITY", "50")), int(os.getenv("NEWSLETTER_IMAGE_MAX_QUALITY", "85")))
+IMAGE_2X = os.getenv("NEWSLETTER_IMAGE_2X", "0") == "1"
+IMAGE_SETTINGS = {"height": TARGET_HEIGHT, "max_bytes": IMAGE_MAX_BYTES, "quality": list(IMAGE_QUALITY_RANGE), "2x": IMAGE_2X}
+
+def _load_json(path: str, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def image_article_urls(entry: dict) -> list[str]:
+    """The article URLs of an image index entry (several articles can share a product image)."""
+    return entry.get("article_urls") or ([entry["article_url"]] if "article_url" in entry else [])
+
+def articles_without_image(urls: list[str]) -> list[str]:
+    """The URLs among `urls` that have no processed image in the image index."""
+    with_image = {url for entry in _load_json(IMAGE_INDEX_FILENAME, {}).values() for url in image_article_urls(entry)}
+    return [url for url in urls if url not in with_image]
+
+def _encode_jpeg(img, max_bytes: int) -> tuple[bytes, int]:
+    """Encodes `img` as progressive JPEG at the highest quality within IMAGE_QUALITY_RANGE that fits `max_bytes`.
+
+    Binary search over the quality; if even the lowest quality is too large, that encoding is returned anyway.
+    """
+    low, high = IMAGE_QUALITY_RANGE
+    best = None
+    while low <= high:
+        quality = (low + high) // 2
+        buffer = BytesIO()
+        img.save(buffer, "JPEG", quality=quality, progressive=True, optimize=True)
+        if buffer.tell() <= max_bytes:
+            best, low = (buffer.getvalue(), quality), quality + 1
+        else:
+            high = quality - 1
+    if best is None:
+        buffer = BytesIO()
+        img.save(buffer, "JPEG", quality=IMAGE_QUALITY_RANGE[0], progressive=True, optimize=True)
+        best = buffer.getvalue(), IMAGE_QUALITY_RANGE[0]
+    return best
+
+def _resize_image_job(job: tuple[bytes, str, str | None]) -> tuple[str, float, dict]:
+    """Decodes and resizes one source image to TARGET_HEIGHT, and to twice that for `retina_path` (runs in a worker process).
+
+    Returns the output path, the seconds spent decoding, resizing and encoding, and the size/quality/bytes written.
+    """
+    from PIL import Image
+
+    data, out_path, retina_path = job
+    start = time.perf_counter()
+    img = Image.open(BytesIO(data))
+    ratio = img.width / img.height
+    size = (int(TARGET_HEIGHT * ratio), TARGET_HEIGHT)
+    # JPEG draft mode lets libjpeg decode at 1/2, 1/4 or 1/8 scale (never below `size`), so large originals
+    # are not fully decoded; the reducing gap then shrinks by an integer factor before the final LANCZOS pass.
+    img.draft("RGB", (size[0] * 2, size[1] * 2) if retina_path else size)
+    img = img.convert("RGB")
+    variants = [(out_path, size, IMAGE_MAX_BYTES)]
+    if retina_path:
+        variants.append((retina_path, (size[0] * 2, size[1] * 2), IMAGE_MAX_BYTES * 2))
+    info = {"size": list(size)}
+    for path, variant_size, max_bytes in variants:
+        encoded, quality = _encode_jpeg(img.resize(variant_size, Image.LANCZOS, reducing_gap=3.0), max_bytes)
+        with open(path, "wb") as f:
+            f.write(encoded)
+        info.setdefault("variants", []).append({"file": os.path.basename(path), "quality": quality, "bytes": len(encoded)})
+    return out_path, time.perf_counter() - start, info
+
+@traced
+def process_images_from_urls(urls: list[str], parallel: bool = True, max_workers: int = IMAGE_WORKERS) -> list[str]:
     """Downloads, resizes, and saves images, returning a list of their absolute file paths."""
-    print(f"TOOL CALLED: process_images_from_urls(urls=...)")
-    TARGET_HEIGHT = 300
-    processed_files = []
-    def get_image_url(article_url):
-        try:
-            r = requests.get(article_url); r.raise_for_status()
-            soup = BeautifulSoup(r.text, "html.parser")
-            meta = soup.find("meta", property="og:image")
-            if meta and meta.get("content"): return meta["content"]
-            img = soup.select_one(".product--image-container img, div.image-slider--item img")
-            if img and "src" in img.attrs:
-                url = img["src"]
-                if url.startswith("//"): return "https:" + url
-                if url.startswith("/"): return f"{article_url.split('/')[0]}//{article_url.split('/')[2]}{url}"
-                return url
-        except: return None
-    for url in urls:
-        img_url = get_image_url(url)
+    print(f"TOOL CALLED: process_images_from_urls(urls=..., parallel={parallel})")
+    run_start = time.perf_counter()
+    index = _load_json(IMAGE_INDEX_FILENAME, {})
+
+    def download(article_url):
+        img_url = fetch_product(article_url).image_url
         if not img_url:
+            return None
+        start = time.perf_counter()
+        data = http_get(img_url).content
+        return img_url, data, time.perf_counter() - start
+
+    jobs, outputs, skipped = {}, {}, 0
+    for url, result in zip(urls, fetch_all(urls, download)):
+        if isinstance(result, Exception):
+            print(f"  -> Failed for {url}: {result}")
+            continue
+        if result is None:
             print(f"  -> No image URL found for {url}.")
             continue
-        try:
-            r = requests.get(img_url); r.raise_for_status()
-            img = Image.open(BytesIO(r.content))
-            ratio = img.width / img.height
-            new_fn = f"{os.path.splitext(os.path.basename(img_url.split('?')[0]))[0]}_300.jpg"
-            img.resize((int(300*ratio), 300), Image.LANCZOS).convert("RGB").save(new_fn, "JPEG")
-            processed_files.append(os.path.abspath(new_fn))
-        except Exception as e: print(f"  -> Failed for {url}: {e}")
-    print(f"✅ Image processing complete. Saved {len(processed_files)} files.")
+        img_url, data, download_seconds = result
+        stem = os.path.splitext(os.path.basename(img_url.split('?')[0]))[0]
+        new_fn = f"{stem}_{TARGET_HEIGHT}.jpg"
+        retina_fn = f"{stem}_{TARGET_HEIGHT * 2}.jpg" if IMAGE_2X else None
+        digest = hashlib.sha256(data).hexdigest()
+        outputs[url] = os.path.abspath(new_fn)
+        previous = index.get(new_fn, {})
+        if (previous.get("source_sha256") == digest and previous.get("settings") == IMAGE_SETTINGS
+                and os.path.exists(new_fn) and (retina_fn is None or os.path.exists(retina_fn))):
+            skipped += 1
+            print(f"  -> {new_fn}: source unchanged, skipped (download {download_seconds:.2f}s)")
+            continue
+        if new_fn not in jobs:
+            jobs[new_fn] = (data, retina_fn, download_seconds)
+        index[new_fn] = {"article_urls": [], "image_url": img_url, "source_sha256": digest, "settings": IMAGE_SETTINGS}
+        if retina_fn:
+            index[new_fn]["retina"] = retina_fn
+
+    done = set()
+    def report(new_fn, resize_seconds, info):
+        done.add(new_fn)
+        index[new_fn]["size"] = info["size"]
+        variants = ", ".join(f"{v['file']} q{v['quality']} {v['bytes'] / 1024:.1f} KB" for v in info["variants"])
+        print(f"  -> {new_fn}: download {jobs[new_fn][2]:.2f}s, resize {resize_seconds:.2f}s ({variants})")
+
+    if parallel and max_workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(jobs))) as pool:
+            futures = {pool.submit(_resize_image_job, (data, new_fn, retina_fn)): new_fn for new_fn, (data, retina_fn, _) in jobs.items()}
+            for future in as_completed(futures):
+                try:
+                    report(futures[future], *future.result()[1:])
+                except Exception as e: print(f"  -> Failed for {futures[future]}: {e}")
+    else:
+        for new_fn, (data, retina_fn, _) in jobs.items():
+            try:
+                report(new_fn, *_resize_image_job((data, new_fn, retina_fn))[1:])
+            except Exception as e: print(f"  -> Failed for {new_fn}: {e}")
+
+    for new_fn in set(jobs) - done:
+        index.pop(new_fn, None)
+    for url, path in outputs.items():
+        entry = index.get(os.path.basename(path))
+        if entry is not None:
+            entry["article_urls"] = list(dict.fromkeys([*image_article_urls(entry), url]))
+            entry.pop("article_url", None)
+    with open(IMAGE_INDEX_FILENAME, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+
+    processed_files = []
+    for path in dict.fromkeys(outputs.values()):
+        name = os.path.basename(path)
+        if name not in jobs or name in done:
+            processed_files.append(path)
+            if index.get(name, {}).get("retina"):
+                processed_files.append(os.path.abspath(index[name]["retina"]))
+    print(f"✅ Image processing complete. Saved {len(processed_files)} files ({skipped} unchanged) in {time.perf_counter() - run_start:.2f}s.")
     return processed_files
 
-async def upload_images_and_get_urls(file_paths: list[str], output_filename: str = "uploaded_image_urls.json") -> str:
-    """Uploads images and saves their public URLs to a JSON file."""
-    print(f"TOOL CALLED: upload_images_and_get_urls for {len(file_paths)} files...")
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=False)
-        context = await browser.new_context()
-        page = await context.new_page()
+# --- Shopware Media Upload ---
+SHOPWARE_URL = os.getenv("SHOPWARE_URL", "https://www.amadoro.de").rstrip("/")
+SHOPWARE_HEADLESS = os.getenv("NEWSLETTER_HEADLESS", "1") != "0"
+SHOPWARE_STORAGE_STATE = os.getenv("SHOPWARE_STORAGE_STATE", ".shopware_storage_state.json")
+SHOPWARE_TOKEN_CACHE = os.getenv("SHOPWARE_TOKEN_CACHE", ".shopware_token.json")
+SHOPWARE_MEDIA_FOLDER = os.getenv("SHOPWARE_MEDIA_FOLDER", "Aktionen")
+UPLOAD_BACKEND = os.getenv("NEWSLETTER_UPLOAD_BACKEND", "playwright")
+
+# Runs inside the logged-in admin page: one filtered search for all uploaded file names instead of
+# paging through the whole media folder. Uses the admin's own bearer token from the `bearerAuth` cookie.
+_SEARCH_MEDIA_JS = """
+async (fileNames) => {
+    const cookie = document.cookie.split('; ').find(c => c.startsWith('bearerAuth='));
+    if (!cookie) return {};
+    const token = JSON.parse(decodeURIComponent(cookie.substring('bearerAuth='.length))).access;
+    const response = await fetch('/api/search/media', {
+        method: 'POST',
+        headers: {'Authorization': `Bearer ${token}`, 'Content-Type': 'application/json', 'Accept': 'application/json'},
+        body: JSON.stringify({
+            limit: fileNames.length * 5,
+            filter: [{type: 'equalsAny', field: 'fileName', value: fileNames}],
+            sort: [{field: 'uploadedAt', order: 'DESC'}],
+            includes: {media: ['fileName', 'url']},
+        }),
+    });
+    if (!response.ok) return {};
+    const urls = {};
+    for (const media of (await response.json()).data) {
+        if (!(media.fileName in urls)) urls[media.fileName] = media.url;
+    }
+    return urls;
+}
+"""
+
+class MediaUploader(ABC):
+    """Interface of the upload backends: an async context manager whose `upload` returns {file name: URL}."""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    @abstractmethod
+    async def upload(self, file_paths: list[str]) -> dict:
+        """Uploads the files and returns {file name: public URL}."""
+
+class PlaywrightMediaUploader(MediaUploader):
+    """Uploads images through the Shopware admin UI, reusing one browser session for all uploads.
+
+    The admin login is persisted as Playwright `storage_state`, so later runs skip the login form and the
+    menu navigation. Uploaded files are found with one filtered media search; only if that fails does it fall
+    back to waiting (in parallel) for the previews in the media folder.
+    """
+
+    def __init__(self, headless: bool = SHOPWARE_HEADLESS, storage_state_path: str = SHOPWARE_STORAGE_STATE):
+        self.headless = headless
+        self.storage_state_path = storage_state_path
+        self._playwright = self._browser = self._context = self.page = None
+
+    async def __aenter__(self):
+        from playwright.async_api import async_playwright
+
         try:
-            await page.goto("https://www.amadoro.de/admin#/login/")
-            await page.get_by_role("textbox", name="Benutzername").fill(os.getenv("AMADORO_LOGIN"))
+            self._playwright = await async_playwright().start()
+            self._browser = await self._playwright.chromium.launch(headless=self.headless)
+            storage_state = self.storage_state_path if os.path.exists(self.storage_state_path) else None
+            self._context = await self._browser.new_context(storage_state=storage_state)
+            self.page = await self._context.new_page()
+        except BaseException:
+            await self.__aexit__(None, None, None)
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info):
+        for closeable in (self._context, self._browser):
+            if closeable is not None:
+                await closeable.close()
+        if self._playwright is not None:
+            await self._playwright.stop()
+
+    async def _open_upload_folder(self):
+        page = self.page
+        media_url = f"{SHOPWARE_URL}/admin#/sw/media/index"
+        login_box = page.get_by_role("textbox", name="Benutzername")
+        root_folder = page.get_by_role("button", name="Folder thumbnail Migration")
+        await page.goto(media_url)
+        await login_box.or_(root_folder).first.wait_for(state="visible", timeout=30000)
+        if await login_box.is_visible():
+            print("INFO:     No valid admin session stored, logging in.")
+            await login_box.fill(os.getenv("AMADORO_LOGIN"))
             await page.get_by_role("textbox", name="Passwort").fill(os.getenv("AMADORO_PASSWORD"))
             await page.get_by_role("button", name="Anmelden").click()
-            await page.get_by_text("Inhalte").click()
-            await page.get_by_label("Hauptnavigation").get_by_role("link", name="Medien").click()
-            await page.get_by_role("button", name="Folder thumbnail Migration").click()
-            await page.get_by_role("button", name="Folder thumbnail Aktionen").click()
+            await login_box.wait_for(state="hidden", timeout=30000)
+            await self._context.storage_state(path=self.storage_state_path)
+            await page.goto(media_url)
+        await root_folder.click()
+        await page.get_by_role("button", name="Folder thumbnail Aktionen").click()
 
-            async with page.expect_file_chooser() as fc_info:
-                await page.get_by_role("button", name="Dateien hochladen").click()
-            file_chooser = await fc_info.value
-            await file_chooser.set_files(file_paths)
+    async def _preview_url(self, alt_name: str) -> str:
+        article_img = self.page.locator(f"img.sw-media-preview-v2__item[alt='{alt_name}']").first
+        await article_img.wait_for(state="visible", timeout=10000)
+        return await article_img.get_attribute("src")
 
-            try:
-                modal = page.locator("div.sw-duplicated-media-v2")
-                await modal.wait_for(state="visible", timeout=3000)
-                await page.get_by_text("Hochladen und ersetzen").click()
-                if await page.get_by_role("checkbox", name=re.compile("Auswahl merken")).is_visible():
-                    await page.get_by_role("checkbox", name=re.compile("Auswahl merken")).check()
-                await page.get_by_role("button", name="Datei ersetzen").click()
-                await modal.wait_for(state="hidden", timeout=10000)
-            except Exception:
-                print("No 'duplicate file' modal appeared.")
-
-            await page.locator("[role=banner]").first.wait_for(state="visible", timeout=5000)
-            await page.wait_for_selector("[role=banner]", state="hidden", timeout=15000)
-            print("Upload confirmed.")
+    async def _preview_urls(self, alt_names: list[str]) -> dict:
+        results = await asyncio.gather(*(self._preview_url(name) for name in alt_names), return_exceptions=True)
+        return {name: url for name, url in zip(alt_names, results) if isinstance(url, str)}
+
+    async def upload(self, file_paths: list[str]) -> dict:
+        """Uploads the files into the "Aktionen" media folder and returns {file name: public URL}."""
+        page = self.page
+        await self._open_upload_folder()
+
+        async with page.expect_file_chooser() as fc_info:
+            await page.get_by_role("button", name="Dateien hochladen").click()
+        file_chooser = await fc_info.value
+        await file_chooser.set_files(file_paths)
 
+        try:
+            modal = page.locator("div.sw-duplicated-media-v2")
+            await modal.wait_for(state="visible", timeout=3000)
+            await page.get_by_text("Hochladen und ersetzen").click()
+            if await page.get_by_role("checkbox", name=re.compile("Auswahl merken")).is_visible():
+                await page.get_by_role("checkbox", name=re.compile("Auswahl merken")).check()
+            await page.get_by_role("button", name="Datei ersetzen").click()
+            await modal.wait_for(state="hidden", timeout=10000)
+        except Exception:
+            print("No 'duplicate file' modal appeared.")
+
+        await page.locator("[role=banner]").first.wait_for(state="visible", timeout=5000)
+        await page.wait_for_selector("[role=banner]", state="hidden", timeout=15000)
+        print("Upload confirmed.")
+
+        alt_names = [os.path.splitext(os.path.basename(path))[0] for path in file_paths]
+        try:
+            found = await page.evaluate(_SEARCH_MEDIA_JS, alt_names)
+        except Exception as e:
+            print(f"  -> Media search failed ({e}), reading the folder previews instead.")
+            found = {}
+        missing = [name for name in alt_names if not found.get(name)]
+        if missing:
+            found.update(await self._preview_urls(missing))
+        missing = [name for name in alt_names if not found.get(name)]
+        if missing:
+            # Last resort: page through the folder until the remaining previews are loaded.
             while await page.get_by_role("button", name="Weitere laden").is_visible():
                 await page.get_by_role("button", name="Weitere laden").click()
                 try:
                     await page.get_by_role("button", name="Weitere laden").wait_for(state="visible", timeout=5000)
                 except Exception:
                     break
-            
-            urls = {}
-            for path in file_paths:
-                name = os.path.basename(path)
-                alt_name = os.path.splitext(name)[0]
-                article_img = page.locator(f"img.sw-media-preview-v2__item[alt='{alt_name}']").first
-                await article_img.wait_for(state="visible", timeout=5000)
-                url = await article_img.get_attribute("src")
-                urls[name] = url
-            
-            print(f"✅ Successfully collected {len(urls)} image URLs.")
-            with open(output_filename, "w", encoding="utf-8") as f:
-                json.dump(urls, f, ensure_ascii=False, indent=2)
-            return f"Successfully saved image URLs to {output_filename}"
-        finally:
-            await context.close()
-            await browser.close()
+            found.update(await self._preview_urls(missing))
+        await self._context.storage_state(path=self.storage_state_path)
+
+        urls = {}
+        for path, alt_name in zip(file_paths, alt_names):
+            if alt_name not in found:
+                raise RuntimeError(f"Uploaded image '{alt_name}' not found in the media folder.")
+            urls[os.path.basename(path)] = found[alt_name]
+        return urls
+
+class ShopwareApiUploader(MediaUploader):
+    """Uploads images straight to the Shopware Admin API over the pooled HTTP session of the shop.
+
+    Authenticates once - with integration credentials (SHOPWARE_CLIENT_ID/SHOPWARE_CLIENT_SECRET) if set,
+    otherwise with the admin user - and caches the access token on disk until it expires. Media entities are
+    created in one sync request; the file uploads then run concurrently.
+    """
+
+    def __init__(self, base_url: str = SHOPWARE_URL, folder_name: str = SHOPWARE_MEDIA_FOLDER, max_workers: int = HTTP_CONCURRENCY, token_cache_path: str = SHOPWARE_TOKEN_CACHE):
+        self.base_url = base_url.rstrip("/")
+        self.folder_name = folder_name
+        self.max_workers = max_workers
+        self.token_cache_path = token_cache_path
+        self.session = get_http_session(self.base_url)
+        self._token_lock = threading.Lock()
+
+    def _token(self, refresh: bool = False) -> str:
+        with self._token_lock:
+            cached = _load_json(self.token_cache_path, {})
+            if not refresh and cached.get("base_url") == self.base_url and cached.get("expires_at", 0) > time.time() + 30:
+                return cached["access_token"]
+            if os.getenv("SHOPWARE_CLIENT_ID"):
+                payload = {"grant_type": "client_credentials", "client_id": os.getenv("SHOPWARE_CLIENT_ID"), "client_secret": os.getenv("SHOPWARE_CLIENT_SECRET")}
+            else:
+                payload = {"grant_type": "password", "client_id": "administration", "scopes": "write", "username": os.getenv("AMADORO_LOGIN"), "password": os.getenv("AMADORO_PASSWORD")}
+            response = self.session.post(f"{self.base_url}/api/oauth/token", json=payload, timeout=HTTP_TIMEOUT)
+            response.raise_for_status()
+            data = response.json()
+            cached = {"base_url": self.base_url, "access_token": data["access_token"], "expires_at": time.time() + data.get("expires_in", 600)}
+            with open(self.token_cache_path, "w", encoding="utf-8") as f:
+                json.dump(cached, f)
+            return cached["access_token"]
+
+    def _request(self, method: str, path: str, headers: dict | None = None, **kwargs):
+        for refresh in (False, True):
+            request_headers = {"Authorization": f"Bearer {self._token(refresh=refresh)}", "Accept": "application/json", **(headers or {})}
+            response = self.session.request(method, f"{self.base_url}{path}", headers=request_headers, timeout=HTTP_TIMEOUT, **kwargs)
+            if response.status_code != 401:
+                break
+        response.raise_for_status()
+        return response.json() if response.content else None
 
+    def _folder_id(self) -> str:
+        data = self._request("POST", "/api/search/media-folder", json={"limit": 1, "filter": [{"type": "equals", "field": "name", "value": self.folder_name}]})
+        if not data["data"]:
+            raise RuntimeError(f"Media folder '{self.folder_name}' not found.")
+        return data["data"][0]["id"]
+
+    def _search_media(self, field: str, values: list[str], folder_id: str) -> list[dict]:
+        criteria = {
+            "limit": len(values),
+            "filter": [{"type": "equalsAny", "field": field, "value": values}, {"type": "equals", "field": "mediaFolderId", "value": folder_id}],
+            "includes": {"media": ["id", "fileName", "url"]},
+        }
+        return self._request("POST", "/api/search/media", json=criteria)["data"]
+
+    def _upload_file(self, media_id: str, path: str):
+        name, extension = os.path.splitext(os.path.basename(path))
+        with open(path, "rb") as f:
+            data = f.read()
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self._request("POST", f"/api/_action/media/{media_id}/upload", params={"extension": extension.lstrip(".").lower(), "fileName": name}, data=data, headers={"Content-Type": content_type})
+
+    def _upload_all(self, file_paths: list[str]) -> dict:
+        folder_id = self._folder_id()
+        names = [os.path.splitext(os.path.basename(path))[0] for path in file_paths]
+        # Files that already exist in the folder are replaced in place, like "Hochladen und ersetzen" in the UI.
+        media_ids = {media["fileName"]: media["id"] for media in self._search_media("fileName", names, folder_id)}
+        new_media = []
+        for name in names:
+            if name not in media_ids:
+                media_ids[name] = uuid.uuid4().hex
+                new_media.append({"id": media_ids[name], "mediaFolderId": folder_id})
+        if new_media:
+            self._request("POST", "/api/_action/sync", json={"create-media": {"entity": "media", "action": "upsert", "payload": new_media}})
+
+        jobs = list(zip(file_paths, names))
+        try:
+            results = fetch_all(jobs, lambda job: self._upload_file(media_ids[job[1]], job[0]), max_workers=self.max_workers)
+            for (path, _), result in zip(jobs, results):
+                if isinstance(result, Exception):
+                    raise RuntimeError(f"Upload of {path} failed: {result}")
+
+            found = {media["fileName"]: media["url"] for media in self._search_media("id", list(media_ids.values()), folder_id)}
+            return {os.path.basename(path): found[name] for path, name in jobs}
+        except Exception:
+            # Otherwise every failed run (which then falls back to the browser upload) leaves empty media entities in the folder.
+            self._delete_media([media["id"] for media in new_media])
+            raise
+
+    def _delete_media(self, media_ids: list[str]):
+        if not media_ids:
+            return
+        try:
+            self._request("POST", "/api/_action/sync", json={"delete-media": {"entity": "media", "action": "delete", "payload": [{"id": media_id} for media_id in media_ids]}})
+        except Exception as e:
+            print(f"  -> Could not delete the {len(media_ids)} media entities created for the failed upload: {e}")
+
+    async def upload(self, file_paths: list[str]) -> dict:
+        """Uploads the files into the media folder and returns {file name: public URL}."""
+        return await asyncio.to_thread(self._upload_all, file_paths)
+
+def get_media_uploader(backend: str = UPLOAD_BACKEND, headless: bool = SHOPWARE_HEADLESS) -> MediaUploader:
+    """Returns the upload backend: "api" (Shopware Admin API) or "playwright" (admin UI)."""
+    if backend == "api":
+        return ShopwareApiUploader()
+    if backend == "playwright":
+        return PlaywrightMediaUploader(headless=headless)
+    raise ValueError(f"Unknown upload backend '{backend}'.")
+
+async def _upload_files(file_paths: list[str], backend: str, headless: bool) -> dict:
+    try:
+        async with get_media_uploader(backend, headless=headless) as uploader:
+            return await uploader.upload(file_paths)
+    except Exception as e:
+        if backend == "playwright":
+            raise
+        print(f"  -> Upload via '{backend}' failed ({e}), falling back to the browser upload.")
+    async with PlaywrightMediaUploader(headless=headless) as uploader:
+        return await uploader.upload(file_paths)
+
+UPLOAD_MANIFEST_FILENAME = "upload_manifest.json"
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+@traced
+async def upload_images_and_get_urls(file_paths: list[str], output_filename: str = "uploaded_image_urls.json", headless: bool = SHOPWARE_HEADLESS, backend: str = UPLOAD_BACKEND) -> str:
+    """Uploads new or changed images and saves the public URLs of all images to a JSON file."""
+    print(f"TOOL CALLED: upload_images_and_get_urls for {len(file_paths)} files...")
+    # upload_manifest.json maps the SHA-256 of an uploaded file to its public media URL, per shop and media
+    # folder, so images that come back unchanged in later newsletters are neither uploaded again nor need a
+    # browser at all. (Entries of the earlier format without a shop are ignored.)
+    manifests = {target: entries for target, entries in _load_json(UPLOAD_MANIFEST_FILENAME, {}).items() if "url" not in entries}
+    manifest = manifests.setdefault(f"{SHOPWARE_URL}/{SHOPWARE_MEDIA_FOLDER}", {})
+    hashes = {path: _file_sha256(path) for path in file_paths}
+    pending = [path for path in file_paths if hashes[path] not in manifest]
+    print(f"  -> {len(file_paths) - len(pending)} images already uploaded, {len(pending)} new or changed.")
+
+    if pending:
+        uploaded = await _upload_files(pending, backend, headless)
+        uploaded_at = datetime.datetime.now().isoformat(timespec="seconds")
+        for path in pending:
+            name = os.path.basename(path)
+            # Uploading a name replaces the media file and its URL, so other entries for that name are dead now.
+            for digest in [digest for digest, entry in manifest.items() if entry["name"] == name]:
+                del manifest[digest]
+            manifest[hashes[path]] = {"name": name, "url": uploaded[name], "uploaded_at": uploaded_at}
+        with open(UPLOAD_MANIFEST_FILENAME, "w", encoding="utf-8") as f:
+            json.dump(manifests, f, ensure_ascii=False, indent=2)
+
+    urls = {os.path.basename(path): manifest[hashes[path]]["url"] for path in file_paths}
+    print(f"✅ Successfully collected {len(urls)} image URLs.")
+    with open(output_filename, "w", encoding="utf-8") as f:
+        json.dump(urls, f, ensure_ascii=False, indent=2)
+    return f"Successfully saved image URLs to {output_filename}"
+
+def newsletter_filename(base_filename: str = "Newsletter") -> str:
+    """The dated file name a newsletter is saved under ('Newsletter' -> 'Newsletter_YYYYMMDD.html')."""
+    return f"{base_filename}_{datetime.date.today().strftime('%Y%m%d')}.html"
+
+@traced
 def write_newsletter_to_file(html_content: str, base_filename: str = "Newsletter") -> str:
     """Saves the provided HTML content to a file with the current date."""
     print(f"TOOL CALLED: write_newsletter_to_file(html_content=..., base_filename='{base_filename}')")
-    today_str = datetime.date.today().strftime("%Y%m%d")
-    output_filename = f"{base_filename}_{today_str}.html"
+    output_filename = newsletter_filename(base_filename)
     try:
         html_match = re.search(r'```html(.*)```', html_content, re.DOTALL)
         if html_match:
             html_content = html_match.group(1).strip()
         
+        if MINIFY_HTML:
+            html_content = minify_html(html_content)
         with open(output_filename, "w", encoding="utf-8") as f:
             f.write(html_content)
         print(f"✅ Newsletter successfully saved to: {output_filename}")
+        report_email_weight(html_content)
         return f"Successfully saved newsletter to {output_filename}"
     except Exception as e:
         return f"Error saving newsletter: {e}"
 
+# --- Email Weight ---
+MINIFY_HTML = os.getenv("NEWSLETTER_MINIFY_HTML", "1") != "0"
+HTML_BUDGET_BYTES = int(float(os.getenv("NEWSLETTER_HTML_BUDGET_KB", "102")) * 1024)  # Gmail clips larger messages
+EMAIL_BUDGET_BYTES = int(float(os.getenv("NEWSLETTER_EMAIL_BUDGET_KB", "800")) * 1024)
+
+# <style> keeps its <!-- ... --> CSS wrapper.
+_HTML_PRESERVED = re.compile(r"(<(pre|textarea|script|style)\b.*?</\2\s*>)", re.DOTALL | re.IGNORECASE)
+# Comments, except Outlook's conditional comments: <!--[if mso]> ... <![endif]--> and the non-Outlook
+# construct <!--[if !mso]><!--> ... <!--<![endif]-->, whose "<!-->" is a complete comment on its own.
+_HTML_COMMENT = re.compile(r"<!--(?!\[if|<!|>).*?-->", re.DOTALL)
+# Only ASCII whitespace: a literal non-breaking space must survive.
+_HTML_SPACE = re.compile(r"[ \t\r\n\f]+")
+# Whitespace next to block-level and table tags is never rendered, so it can go entirely.
+_HTML_BLOCK_TAGS = r"(?:html|head|body|title|meta|link|style|table|thead|tbody|tfoot|tr|td|th|p|div|center|br|hr|ul|ol|li|h[1-6])"
+_HTML_SPACE_AFTER_BLOCK = re.compile(rf"(<(?:/?){_HTML_BLOCK_TAGS}\b[^>]*>) ")
+_HTML_SPACE_BEFORE_BLOCK = re.compile(rf" (</?{_HTML_BLOCK_TAGS}\b)")
+
+def minify_html(html_content: str) -> str:
+    """Drops comments and redundant whitespace without changing how the email renders.
+
+    Runs of whitespace collapse to one space (as the browser does) and disappear next to block-level tags;
+    <pre>, <textarea>, <script> and <style> are left untouched.
+    """
+    parts = _HTML_PRESERVED.split(html_content)
+    # split() with two groups yields [text, preserved block, tag name, text, ...].
+    for i in range(0, len(parts), 3):
+        text = _HTML_SPACE.sub(" ", _HTML_COMMENT.sub("", parts[i]))
+        parts[i] = _HTML_SPACE_BEFORE_BLOCK.sub(r"\1", _HTML_SPACE_AFTER_BLOCK.sub(r"\1", text))
+    return "".join(part for i, part in enumerate(parts) if i % 3 != 2).strip()
+
+_IMG_SRC = re.compile(r"<img\b[^>]*?\bsrc=[\"']?([^\"' >]+)", re.IGNORECASE)
+
+def report_email_weight(html_content: str, image_urls_filename: str = "uploaded_image_urls.json") -> dict:
+    """Prints the weight of the email (HTML plus the processed images it references) against the budgets.
+
+    Images that were not produced by this pipeline (logo, buttons) are counted as external and not weighed.
+    """
+    return _report_weight(len(html_content.encode("utf-8")), _IMG_SRC.findall(html_content), image_urls_filename)
+
+def _report_weight(html_bytes: int, image_srcs: list[str], image_urls_filename: str = "uploaded_image_urls.json") -> dict:
+    local_files = {url: name for name, url in _load_json(image_urls_filename, {}).items()}
+    image_bytes, external = 0, 0
+    for src in dict.fromkeys(image_srcs):
+        name = local_files.get(src)
+        if name and os.path.exists(name):
+            image_bytes += os.path.getsize(name)
+        else:
+            external += 1
+    weight = {"html_bytes": html_bytes, "image_bytes": image_bytes, "total_bytes": html_bytes + image_bytes, "external_images": external,
+              "html_budget_bytes": HTML_BUDGET_BYTES, "total_budget_bytes": EMAIL_BUDGET_BYTES}
+    run_trace.info["email_weight"] = weight
+    print(f"  -> Email weight: HTML {html_bytes / 1024:.1f} KB (budget {HTML_BUDGET_BYTES / 1024:.0f} KB), images {image_bytes / 1024:.1f} KB, "
+          f"total {weight['total_bytes'] / 1024:.1f} KB (budget {EMAIL_BUDGET_BYTES / 1024:.0f} KB; {external} external images not counted)")
+    if html_bytes > HTML_BUDGET_BYTES:
+        print(f"  -> WARNING: The HTML exceeds {HTML_BUDGET_BYTES / 1024:.0f} KB; Gmail will clip the message.")
+    if weight["total_bytes"] > EMAIL_BUDGET_BYTES:
+        print(f"  -> WARNING: The email exceeds its total budget of {EMAIL_BUDGET_BYTES / 1024:.0f} KB.")
+    return weight
+
+# --- Newsletter Rendering ---
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Newsletter-Template.html")
+_ARTICLE_START, _ARTICLE_END = "<!-- ARTICLE START -->", "<!-- ARTICLE END -->"
+_BORDER_TOP = "BORDER-TOP: #d4d4d4 2px solid"
+_BORDER_TOP_BOTTOM = "BORDER-TOP: #d4d4d4 2px solid; BORDER-BOTTOM: #d4d4d4 2px solid"
+_PRICE_RE = re.compile(r"\d{1,3}(?:\.\d{3})*,\d{2}")
+_PRICE_PER_UNIT_RE = re.compile(r"(\d{1,3}(?:\.\d{3})*,\d{2})\s*€?\*?\s*/\s*(?:1\s+)?([^)]+)")
+COPY_SCHEMA = '{"intro": "...", "outro": "...", "articles": [{"url": "...", "headline": "...", "teaser": "...", "price_label": "je Flasche", "vat": "19%", "rating": "", "content_note": ""}]}'
+
+def load_newsletter_template(path: str = TEMPLATE_PATH) -> tuple[Template, Template, Template]:
+    """Splits the newsletter template into the head (logo and intro), the article block and the footer."""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    head, rest = text.split(_ARTICLE_START, 1)
+    article, footer = rest.split(_ARTICLE_END, 1)
+    return Template(head), Template(article.strip("\n")), Template(footer)
+
+def _copy_html(text: str) -> str:
+    return escape(text.strip(), quote=False).replace("\n", "<br>")
+
+def format_price(raw: str) -> str:
+    """Returns the amount of a scraped price ('1.059,00 €*' -> '1.059,00')."""
+    match = _PRICE_RE.search(raw)
+    return match.group(0) if match else raw.replace("€", "").replace("*", "").strip()
+
+def format_content_line(data: dict, content_note: str = "") -> str:
+    """Builds the 'Inhalt: ... Pro Liter ... EUR.' line from the scraped unit fields."""
+    unit_content = data.get("unit_content", "N/A")
+    if unit_content != "N/A":
+        line = f"Inhalt: {unit_content}."
+    else:
+        line = f"Inhalt: {content_note.strip().rstrip('.')}." if content_note.strip() else ""
+    match = _PRICE_PER_UNIT_RE.search(data.get("price_per_unit", ""))
+    if match:
+        line += f" Pro {match.group(2).strip()} {match.group(1)} EUR."
+    return escape(line.strip(), quote=False)
+
+def render_article(article_template: Template, url: str, copy: dict, data: dict, image_url: str | None, last: bool = False, image_size: tuple[int, int] | None = None) -> str:
+    """Renders one article block; prices, units and links come from the data, only the wording from `copy`.
+
+    `image_size` sets the displayed width/height of the image (for 2x images, which would otherwise render at
+    twice the size in clients that ignore the max-width/max-height style).
+    """
+    rating = copy.get("rating", "").strip()
+    price_line = f"nur {format_price(data['price'])} EUR {copy.get('price_label', '').strip()}".strip() + "!"
+    return article_template.substitute(
+        table_style=_BORDER_TOP_BOTTOM if last else _BORDER_TOP,
+        url=escape(url),
+        image_url=escape(image_url or ""),
+        image_attrs=f" width={image_size[0]} height={image_size[1]}" if image_size else "",
+        headline=_copy_html(copy["headline"]),
+        teaser=_copy_html(copy["teaser"]),
+        rating=f"<font color=#c01513>{_copy_html(rating)}</font><br>" if rating else "",
+        price_line=escape(price_line, quote=False),
+        content_line=format_content_line(data, copy.get("content_note", "")),
+        vat=escape(copy.get("vat") or "19%", quote=False),
+    )
+
+def render_newsletter(copy: dict, scraped: dict, image_urls: dict, template_path: str = TEMPLATE_PATH, image_sizes: dict | None = None) -> str:
+    """Assembles the complete newsletter HTML from the writer's copy, the scraped data and the image URLs."""
+    head, article_template, footer = load_newsletter_template(template_path)
+    copies = {article["url"].rstrip("/"): article for article in copy.get("articles", [])}
+    check_scraped_articles(scraped)
+    urls = list(scraped)
+    missing = [url for url in urls if url.rstrip("/") not in copies]
+    if missing:
+        raise ValueError(f"No copy for the articles {', '.join(missing)}")
+    check_article_images(urls, image_urls)
+    blocks = [render_article(article_template, url, copies[url.rstrip("/")], scraped[url], image_urls.get(url), last=(i == len(urls) - 1), image_size=(image_sizes or {}).get(url)) for i, url in enumerate(urls)]
+    return head.substitute(intro=_copy_html(copy["intro"]), outro=_copy_html(copy["outro"])) + "\n".join(blocks) + footer.substitute()
+
+def check_scraped_articles(scraped: dict):
+    """Raises ValueError if an article could not be scraped (it would silently be missing from the newsletter)."""
+    failed = [f"{url} ({data['error']})" for url, data in scraped.items() if "error" in data]
+    if failed:
+        raise ValueError(f"Scraping failed for the articles {', '.join(failed)}; fix or remove them from the article list and run again")
+
+def check_article_images(urls: list[str], image_urls: dict):
+    """Raises ValueError if an article has no image URL (the newsletter would show a broken image)."""
+    missing = [url for url in urls if not image_urls.get(url)]
+    if missing:
+        raise ValueError(f"No image for the articles {', '.join(missing)} (see {IMAGE_INDEX_FILENAME})")
+
+def article_image_urls(image_urls_filename: str = "uploaded_image_urls.json") -> dict:
+    """Maps each article URL to its uploaded image URL (the 2x variant if there is one), falling back to the shop's original image."""
+    uploaded = _load_json(image_urls_filename, {})
+    return {article_url: uploaded.get(entry.get("retina")) or uploaded.get(name) or entry.get("image_url")
+            for name, entry in _load_json(IMAGE_INDEX_FILENAME, {}).items() for article_url in image_article_urls(entry)}
+
+# The article image is shown at most this large (max-width/max-height in the template's image style).
+_IMAGE_DISPLAY_BOX = (200, 300)
+
+def article_image_sizes(image_urls_filename: str = "uploaded_image_urls.json") -> dict:
+    """Maps each article URL whose uploaded 2x image is used to the size that image is displayed at."""
+    uploaded = _load_json(image_urls_filename, {})
+    sizes = {}
+    for entry in _load_json(IMAGE_INDEX_FILENAME, {}).values():
+        if uploaded.get(entry.get("retina")) and entry.get("size"):
+            width, height = entry["size"]
+            scale = min(1, _IMAGE_DISPLAY_BOX[0] / width, _IMAGE_DISPLAY_BOX[1] / height)
+            for article_url in image_article_urls(entry):
+                sizes[article_url] = (round(width * scale), round(height * scale))
+    return sizes
+
+def parse_copy_payload(copy_json: str) -> dict:
+    """Parses the writer's JSON copy, with or without a surrounding code fence."""
+    match = re.search(r"```(?:json)?\s*(.*?)```", copy_json, re.DOTALL)
+    return json.loads(match.group(1) if match else copy_json)
+
+# --- Article Copy Cache ---
+COPY_CACHE_FILENAME = os.getenv("NEWSLETTER_COPY_CACHE", "copy_cache.json")
+COPY_CACHE_MAX_ENTRIES = int(os.getenv("NEWSLETTER_COPY_CACHE_MAX_ENTRIES", "500"))
+COPY_CACHE_MAX_AGE_DAYS = float(os.getenv("NEWSLETTER_COPY_CACHE_MAX_AGE_DAYS", "180"))
+_copy_cache_lock = threading.Lock()
+
+class CopyCache:
+    """Persistent cache of the writer's per-article copy, keyed on the article URL and its scraped data.
+
+    A changed description, price or unit yields a new key, so only new or changed articles go to the model.
+    Entries unused for `max_age_days` are dropped; beyond `max_entries` the least recently used go first.
+    """
+
+    def __init__(self, path: str = COPY_CACHE_FILENAME, max_entries: int = COPY_CACHE_MAX_ENTRIES, max_age_days: float = COPY_CACHE_MAX_AGE_DAYS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.entries = _load_json(path, {})
+
+    @staticmethod
+    def key(url: str, data: dict) -> str:
+        fields = [url.rstrip("/")] + [data.get(field, "") for field in ("description", "price", "unit_content", "price_per_unit")]
+        return hashlib.sha256("\x1f".join(fields).encode("utf-8")).hexdigest()
+
+    def get(self, url: str, data: dict) -> dict | None:
+        entry = self.entries.get(self.key(url, data))
+        if entry is None:
+            return None
+        entry["used_at"] = time.time()
+        return entry["copy"]
+
+    def put(self, url: str, data: dict, copy: dict):
+        now = time.time()
+        self.entries[self.key(url, data)] = {"url": url, "copy": copy, "created_at": now, "used_at": now}
+
+    def save(self):
+        with _copy_cache_lock:
+            # Writers of other editions (batch mode) may have saved since this cache was loaded; keep their entries.
+            for key, entry in _load_json(self.path, {}).items():
+                if key not in self.entries or entry["used_at"] > self.entries[key]["used_at"]:
+                    self.entries[key] = entry
+            min_used_at = time.time() - self.max_age_days * 86400
+            entries = sorted((item for item in self.entries.items() if item[1]["used_at"] >= min_used_at), key=lambda item: item[1]["used_at"], reverse=True)
+            self.entries = dict(entries[:self.max_entries])
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=2)
+
+def merge_cached_copy(copy: dict, scraped: dict, cache: CopyCache) -> dict:
+    """Completes the writer's copy with cached article copy and stores the newly written articles in the cache."""
+    written = {article["url"].rstrip("/"): article for article in copy.get("articles", [])}
+    articles = []
+    for url, data in scraped.items():
+        if "error" in data:
+            continue
+        article = written.get(url.rstrip("/"))
+        if article is not None:
+            cache.put(url, data, {key: value for key, value in article.items() if key != "url"})
+        else:
+            cached = cache.get(url, data)
+            article = {"url": url, **cached} if cached is not None else None
+        if article is not None:
+            articles.append(article)
+    return {**copy, "articles": articles}
+
+@traced
+def get_articles_needing_copy(scraped_texts_filename: str = "scraped_texts.json") -> str:
+    """Returns (as JSON) the articles that need new copy and the headlines of the articles whose copy is reused from the cache."""
+    print(f"TOOL CALLED: get_articles_needing_copy(scraped_texts_filename='{scraped_texts_filename}')")
+    try:
+        with open(scraped_texts_filename, "r", encoding="utf-8") as f:
+            scraped = json.load(f)
+        check_scraped_articles(scraped)
+    except ValueError as e:
+        return f"Error: {e}"
+    except Exception as e:
+        return f"Error reading file {scraped_texts_filename}: {e}"
+    cache = CopyCache()
+    needs_copy, cached = {}, {}
+    for url, data in scraped.items():
+        if "error" in data:
+            continue
+        copy = cache.get(url, data)
+        if copy is None:
+            needs_copy[url] = data
+        else:
+            cached[url] = copy.get("headline", "")
+    print(f"  -> {len(cached)} articles served from the copy cache, {len(needs_copy)} need new copy.")
+    return json.dumps({"needs_copy": needs_copy, "cached": cached}, ensure_ascii=False)
+
+@traced
+def save_newsletter_from_copy(copy_json: str, scraped_texts_filename: str = "scraped_texts.json", image_urls_filename: str = "uploaded_image_urls.json", base_filename: str = "Newsletter") -> str:
+    """Renders the newsletter HTML from the JSON copy (intro, outro, per-article texts) and the scraped data, and saves it."""
+    print(f"TOOL CALLED: save_newsletter_from_copy(copy_json=..., scraped_texts_filename='{scraped_texts_filename}', image_urls_filename='{image_urls_filename}')")
+    cache = CopyCache()
+    try:
+        with open(scraped_texts_filename, "r", encoding="utf-8") as f:
+            scraped = json.load(f)
+        copy = merge_cached_copy(parse_copy_payload(copy_json), scraped, cache)
+        html_content = render_newsletter(copy, scraped, article_image_urls(image_urls_filename), image_sizes=article_image_sizes(image_urls_filename))
+    except Exception as e:
+        return f"Error rendering newsletter: {e}"
+    result = write_newsletter_to_file(html_content, base_filename)
+    if result.startswith("Error"):
+        return result
+    cache.save()
+    return f"{result}. {validate_newsletter(newsletter_filename(base_filename), scraped_texts_filename, image_urls_filename)}"
+
+# --- Newsletter Validation ---
+_AMOUNT = r"(\d{1,3}(?:\.\d{3})*,\d{2})\s*(?:EUR|€)"
+# Anchored to the rendered lines ("nur 12,90 EUR je Flasche!", "Inhalt: 0,75 Liter. Pro Liter 17,20 EUR."),
+# so a price mentioned in the teaser is never taken for the price line.
+_PRICE_LINE_RE = re.compile(r"^\s*nur\s+" + _AMOUNT + r"[^!]*!\s*$")
+_PER_UNIT_LINE_RE = re.compile(r"(?:^\s*|\.\s+)Pro\b.*?" + _AMOUNT + r"\.?\s*$")
+_CONTENT_LINE_RE = re.compile(r"\s*Inhalt:\s*(.*?)\.?\s*(?=\bPro\b|$)")
+_NUMBER_RE = re.compile(r"\d+(?:,\d+)?")
+
+def _numbers(text: str) -> set[float]:
+    return {float(number.replace(",", ".")) for number in _NUMBER_RE.findall(text.replace(".", ""))}
+
+def _article_blocks(doc, urls: list[str]) -> dict:
+    """Maps each article URL to the largest element that links to that article and to no other one."""
+    wanted = {url.rstrip("/"): url for url in urls}
+    linked = {}
+    first_link = {}
+    for link in doc.iter("a"):
+        url = wanted.get((link.get("href") or "").strip().rstrip("/"))
+        if url is None:
+            continue
+        first_link.setdefault(url, link)
+        for element in link.iterancestors():
+            linked.setdefault(element, set()).add(url)
+    blocks = {}
+    for url, link in first_link.items():
+        block = link
+        for element in link.iterancestors():
+            if element.tag in ("body", "html") or linked[element] != {url}:
+                break
+            block = element
+        blocks[url] = block
+    return blocks
+
+def _price_elements(block):
+    """Finds the template's price line (<font color=#c01513><strong>nur ...!</strong></font>) and the <br> whose tail is the content line."""
+    for strong in block.iterfind(".//font[@color='#c01513']/strong"):
+        if _PRICE_LINE_RE.match(strong.text or ""):
+            br = strong.getparent().getnext()
+            return strong, br if br is not None and br.tag == "br" else None
+    return None, None
+
+def _check_article(block, data: dict) -> tuple[list[str], list[tuple[str, str]]]:
+    """Compares price, unit content and price per unit in one article block with the scraped data.
+
+    Mismatches are fixed in the tree; returns the issues and the (old, new) text of every changed text node.
+    """
+    expected_price = format_price(data.get("price", "N/A")) if data.get("price", "N/A") != "N/A" else None
+    per_unit = _PRICE_PER_UNIT_RE.search(data.get("price_per_unit", ""))
+    expected_per_unit = per_unit.group(1) if per_unit else None
+    unit_content = data.get("unit_content", "N/A")
+    expected_unit = unit_content if unit_content != "N/A" else None
+
+    patches, found, edits = [], set(), []
+    strong, br = _price_elements(block)
+    for element, attribute, fields in ((strong, "text", ("price",)), (br, "tail", ("price_per_unit", "unit_content"))):
+        text = original = (getattr(element, attribute) or "") if element is not None else ""
+        for field, pattern, expected in (("price", _PRICE_LINE_RE, expected_price), ("price_per_unit", _PER_UNIT_LINE_RE, expected_per_unit)):
+            match = pattern.search(text) if field in fields else None
+            if match and expected:
+                found.add(field)
+                if match.group(1) != expected:
+                    patches.append(f"{field} {match.group(1)} -> {expected}")
+                    text = text[:match.start(1)] + expected + text[match.end(1):]
+        match = _CONTENT_LINE_RE.match(text) if "unit_content" in fields else None
+        if match and expected_unit:
+            found.add("unit_content")
+            shown = match.group(1).strip()
+            # Tolerates rewording ("1 x 0,75l" for "0,75 Liter") as long as the quantities match.
+            if not (_numbers(expected_unit) <= _numbers(shown) if _numbers(expected_unit) else expected_unit.lower() in shown.lower()):
+                patches.append(f"unit_content '{shown}' -> '{expected_unit}'")
+                text = text[:match.start(1)] + expected_unit + text[match.end(1):]
+        if text != original:
+            setattr(element, attribute, text)
+            edits.append((original, text))
+    missing = [field for field, expected in (("price", expected_price), ("price_per_unit", expected_per_unit), ("unit_content", expected_unit)) if expected and field not in found]
+    return patches + [f"{field} not found" for field in missing], edits
+
+def _patch_source(html_content: str, start: int, edits: list[tuple[str, str]]) -> str | None:
+    """Applies text node edits to the HTML source in order, from `start` on; None if a node is not found as rendered."""
+    for old, new in edits:
+        node = ">" + escape(old, quote=False) + "<"
+        index = html_content.find(node, start)
+        if index < 0:
+            return None
+        html_content = html_content[:index + 1] + escape(new, quote=False) + html_content[index + len(node) - 1:]
+        start = index + 1
+    return html_content
+
+@traced
+def validate_newsletter(html_filename: str, scraped_texts_filename: str = "scraped_texts.json", image_urls_filename: str = "uploaded_image_urls.json") -> str:
+    """Checks every article's price, unit content and price per unit in the saved newsletter against the scraped data.
+
+    The HTML is parsed once and each article block is found by its link URL; within it, only the template's
+    price and content lines are checked, never the copy. Wrong values are patched in place in the file, so a
+    mismatch never requires regenerating the newsletter.
+    """
+    print(f"TOOL CALLED: validate_newsletter(html_filename='{html_filename}', scraped_texts_filename='{scraped_texts_filename}')")
+    try:
+        with open(scraped_texts_filename, "r", encoding="utf-8") as f:
+            scraped = {url: data for url, data in json.load(f).items() if "error" not in data}
+        with open(html_filename, "r", encoding="utf-8") as f:
+            source = f.read()
+        doc = lxml.html.document_fromstring(source)
+    except Exception as e:
+        return f"Error validating newsletter: {e}"
+
+    blocks = _article_blocks(doc, list(scraped))
+    problems, patched, patched_source = {}, 0, source
+    for url, data in scraped.items():
+        if url not in blocks:
+            problems[url] = ["article not found"]
+            continue
+        issues, edits = _check_article(blocks[url], data)
+        patched += sum("->" in issue for issue in issues)
+        if issues:
+            problems[url] = issues
+        if edits and patched_source is not None:
+            # Edit the source text rather than serializing the tree, which would undo the minification and the markup as written.
+            href = next(blocks[url].iter("a")).get("href")
+            patched_source = _patch_source(patched_source, max(patched_source.find(f'href="{escape(href)}"'), 0), edits)
+    for url, issues in problems.items():
+        print(f"  -> {url}: {'; '.join(issues)}")
+
+    if patched:
+        if patched_source is not None:
+            html_content = patched_source
+        else:
+            # etree's serializer keeps the charset <meta>, which lxml.html.tostring drops.
+            html_content = etree.tostring(doc, method="html", encoding="unicode", doctype=doc.getroottree().docinfo.doctype if source.lstrip()[:9].lower() == "<!doctype" else None)
+            if MINIFY_HTML:
+                html_content = minify_html(html_content)
+        with open(html_filename, "w", encoding="utf-8") as f:
+            f.write(html_content)
+        report_email_weight(html_content, image_urls_filename)
+    unresolved = sum(len(issues) for issues in problems.values()) - patched
+    print(f"✅ Validated {len(scraped)} articles: {patched} values patched, {unresolved} unresolved.")
+    return f"Validated {len(scraped)} articles: {patched} values patched in place, {unresolved} unresolved"
+
+# --- Streaming Writer Output ---
+WRITER_STREAMING = os.getenv("NEWSLETTER_WRITER_STREAMING", "0") == "1"
+# A fence may share its line with the copy ("```json {...}"), so it is cut off rather than the line dropped.
+_CODE_FENCE = re.compile(r"^\s*```[\w-]*|```\s*$")
+
+class FenceStripper:
+    """Splits text arriving in chunks into complete lines, with Markdown code fences removed."""
+
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, chunk: str) -> list[str]:
+        *lines, self.buffer = (self.buffer + chunk).split("\n")
+        return [line for line in map(self._strip, lines) if line]
+
+    def close(self) -> list[str]:
+        line, self.buffer = self._strip(self.buffer), ""
+        return [line] if line else []
+
+    @staticmethod
+    def _strip(line: str) -> str:
+        return _CODE_FENCE.sub("", line).strip()
+
+class NewsletterStreamWriter:
+    """Renders the newsletter into its dated file while the writer's copy streams in.
+
+    The copy arrives as JSON lines: first {"intro", "outro"}, then one line per article. An article block is
+    written as soon as its copy and that of all articles before it (in scraped order) are there; cached articles
+    fill the gaps. The file is written as <name>.part and renamed once the footer is written.
+    """
+
+    def __init__(self, scraped_texts_filename: str = "scraped_texts.json", image_urls_filename: str = "uploaded_image_urls.json", base_filename: str = "Newsletter"):
+        with open(scraped_texts_filename, "r", encoding="utf-8") as f:
+            self.scraped = json.load(f)
+        check_scraped_articles(self.scraped)
+        self.urls = list(self.scraped)
+        self.image_urls = article_image_urls(image_urls_filename)
+        self.image_sizes = article_image_sizes(image_urls_filename)
+        check_article_images(self.urls, self.image_urls)
+        self.image_urls_filename = image_urls_filename
+        self.head, self.article_template, self.footer = load_newsletter_template()
+        self.cache = CopyCache()
+        self.copies = {}
+        self.written = 0
+        self.output_filename = newsletter_filename(base_filename)
+        self.file = None
+        self.html_bytes = 0
+        self.image_srcs = []
+        self.lines = FenceStripper()
+
+    def feed(self, chunk: str):
+        for line in self.lines.feed(chunk):
+            self._add(line)
+
+    def _add(self, line: str):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        if not isinstance(record, dict):
+            print(f"  -> Ignoring writer output that is not a JSON line: {line[:80]}")
+            return
+        if "url" in record:
+            url = next((url for url in self.urls if url.rstrip("/") == record["url"].rstrip("/")), None)
+            if url is None:
+                print(f"  -> Ignoring copy for an unknown article: {record['url']}")
+                return
+            self.copies[url] = record
+            self.cache.put(url, self.scraped[url], {key: value for key, value in record.items() if key != "url"})
+        elif "intro" in record and self.file is None:
+            self.file = open(self.output_filename + ".part", "w", encoding="utf-8")
+            self._write(self.head.substitute(intro=_copy_html(record["intro"]), outro=_copy_html(record.get("outro", ""))))
+        self._flush()
+
+    def _flush(self):
+        """Writes the next articles in order, as far as their copy is available."""
+        while self.file is not None and self.written < len(self.urls):
+            url = self.urls[self.written]
+            copy = self.copies.get(url) or self.cache.get(url, self.scraped[url])
+            if copy is None:
+                return
+            self._write(("\n" if self.written else "") + render_article(self.article_template, url, copy, self.scraped[url], self.image_urls.get(url),
+                                                                       last=(self.written == len(self.urls) - 1), image_size=self.image_sizes.get(url)))
+            self.written += 1
+            print(f"  -> Article {self.written}/{len(self.urls)} written: {url}")
+
+    def _write(self, html_content: str):
+        if MINIFY_HTML:
+            html_content = minify_html(html_content)
+        self.file.write(html_content)
+        self.file.flush()
+        self.html_bytes += len(html_content.encode("utf-8"))
+        self.image_srcs += _IMG_SRC.findall(html_content)
+
+    def close(self) -> str:
+        """Completes the file; raises ValueError if the intro line or the copy of an article never arrived."""
+        for line in self.lines.close():
+            self._add(line)
+        if self.file is None:
+            raise ValueError("The writer sent no intro line.")
+        if self.written < len(self.urls):
+            raise ValueError(f"No copy for the articles {', '.join(self.urls[self.written:])}")
+        self._write(self.footer.substitute())
+        self.file.close()
+        os.replace(self.output_filename + ".part", self.output_filename)
+        self.cache.save()
+        print(f"✅ Newsletter successfully saved to: {self.output_filename}")
+        _report_weight(self.html_bytes, self.image_srcs, self.image_urls_filename)
+        return f"Successfully saved newsletter to {self.output_filename}"
+
+    def abort(self):
+        """Removes the partial file (after a failed run)."""
+        if self.file is not None:
+            self.file.close()
+            if os.path.exists(self.output_filename + ".part"):
+                os.remove(self.output_filename + ".part")
+
 # --- Agent Definitions ---
 lite_model_name = "gemini-2.5-flash"
 writer_model_name = "gemini-2.5-pro"
 print(f"INFO:     Using models: '{lite_model_name}' (for specialists) and '{writer_model_name}' (for writer).")
 
-image_agent = LlmAgent(name="ImageProcessingAgent", model=Gemini(model=lite_model_name), instruction="Your only job is to call the `process_images_from_urls` tool. CRITICAL: After the tool call, you MUST respond with the list of file paths returned by the tool.", tools=[process_images_from_urls])
-upload_agent = LlmAgent(name="UploadAgent", model=Gemini(model=lite_model_name), instruction="Your only job is to call the `upload_images_and_get_urls` tool. CRITICAL: After the tool call, you MUST respond with the filename of the saved URL dictionary.", tools=[upload_images_and_get_urls])
-scraper_agent = LlmAgent(name="TextScrapingAgent", model=Gemini(model=lite_model_name), instruction="Your only job is to call the `get_and_save_all_article_texts` tool. CRITICAL: After the tool call, you MUST respond with the filename where the texts were saved.", tools=[get_and_save_all_article_texts])
-writer_agent = LlmAgent(name="NewsletterWriterAgent", model=Gemini(model=writer_model_name), instruction="You are an expert copywriter. Your job is to read files containing structured data (JSON), generate a complete HTML newsletter ensuring price accuracy, and then save it to a file using your tool. CRITICAL: After saving, you MUST respond with a confirmation message.", tools=[read_file_content, write_newsletter_to_file])
-print("✅ Specialist agents defined.")
-
-coordinator_agent = LlmAgent(
-    name="CoordinatorAgent",
-    model=Gemini(model=lite_model_name),
-    instruction="You are the project manager. Coordinate your team of agents to create a newsletter. Call them in the correct order and pass the necessary data (file paths, URLs) between them. Your job is only finished when the writer agent confirms the file has been saved.",
-    tools=[AgentTool(agent=image_agent), AgentTool(agent=upload_agent), AgentTool(agent=scraper_agent), AgentTool(agent=writer_agent)],
-)
-print("✅ Coordinator agent defined.")
-
-async def main():
-    instructions_path = "C:/Users/chris/Documents/dev/Codriver/Newsletter-Instructions.txt"
-    article_list_path = "C:/Users/chris/Documents/dev/Codriver/Artikelliste_Newsletter.txt"
-    html_example_path = "C:/Users/chris/Documents/dev/Codriver/Newsletter-Text_20251123.html"
-    scraped_texts_filename = "scraped_texts.json"
-    image_urls_filename = "uploaded_image_urls.json"
+# The agents are built on first use (and only once), so importing this module does not load ADK.
+def _build_agent(name: str, model_name: str, instruction: str, tools: list) -> "LlmAgent":
+    from google.adk.agents import LlmAgent
+    from google.adk.models.google_llm import Gemini
+
+    agent = LlmAgent(name=name, model=Gemini(model=model_name), instruction=instruction, tools=tools, before_model_callback=run_trace.llm_started, after_model_callback=run_trace.llm_finished)
+    print(f"✅ {name} defined.")
+    return agent
 
+@functools.cache
+def get_image_agent() -> "LlmAgent":
+    return _build_agent("ImageProcessingAgent", lite_model_name, "Your only job is to call the `process_images_from_urls` tool. CRITICAL: After the tool call, you MUST respond with the list of file paths returned by the tool.", [process_images_from_urls])
+
+@functools.cache
+def get_upload_agent() -> "LlmAgent":
+    return _build_agent("UploadAgent", lite_model_name, "Your only job is to call the `upload_images_and_get_urls` tool. CRITICAL: After the tool call, you MUST respond with the filename of the saved URL dictionary.", [upload_images_and_get_urls])
+
+@functools.cache
+def get_scraper_agent() -> "LlmAgent":
+    return _build_agent("TextScrapingAgent", lite_model_name, "Your only job is to call the `get_and_save_all_article_texts` tool. CRITICAL: After the tool call, you MUST respond with the filename where the texts were saved.", [get_and_save_all_article_texts])
+
+@functools.cache
+def get_writer_agent() -> "LlmAgent":
+    return _build_agent("NewsletterWriterAgent", writer_model_name, "You are an expert copywriter. Your job is to read files containing structured data (JSON), write only the newsletter copy as a compact JSON payload (layout, prices, units and image URLs are filled in from the data automatically), and then save it using your `save_newsletter_from_copy` tool. CRITICAL: After saving, you MUST respond with a confirmation message.", [read_file_content, get_articles_needing_copy, save_newsletter_from_copy])
+
+@functools.cache
+def get_streaming_writer_agent() -> "LlmAgent":
+    """The writer for streamed output: it replies with the copy as JSON lines, which are saved while they arrive."""
+    return _build_agent("NewsletterWriterAgent", writer_model_name, "You are an expert copywriter. Your job is to read files containing structured data (JSON) and write only the newsletter copy as JSON lines (layout, prices, units and image URLs are filled in from the data automatically). Your reply is saved to the newsletter file while you write it, so it MUST contain nothing but the JSON lines.", [read_file_content, get_articles_needing_copy])
+
+@functools.cache
+def get_coordinator_agent() -> "LlmAgent":
+    from google.adk.tools import AgentTool
+
+    return _build_agent(
+        "CoordinatorAgent",
+        lite_model_name,
+        "You are the project manager. Coordinate your team of agents to create a newsletter. Call them in the correct order and pass the necessary data (file paths, URLs) between them. Your job is only finished when the writer agent confirms the file has been saved.",
+        [AgentTool(agent=get_image_agent()), AgentTool(agent=get_upload_agent()), AgentTool(agent=get_scraper_agent()), AgentTool(agent=get_writer_agent())],
+    )
+
+# --- Pipeline Runners ---
+INSTRUCTIONS_PATH = "C:/Users/chris/Documents/dev/Codriver/Newsletter-Instructions.txt"
+ARTICLE_LIST_PATH = "C:/Users/chris/Documents/dev/Codriver/Artikelliste_Newsletter.txt"
+SCRAPED_TEXTS_FILENAME = "scraped_texts.json"
+IMAGE_URLS_FILENAME = "uploaded_image_urls.json"
+WRITER_CONCURRENCY = int(os.getenv("NEWSLETTER_WRITER_CONCURRENCY", "3"))
+APP_NAME = "newsletter_app"
+USER_ID = "user1"
+
+# --- Run Manifest ---
+RUN_MANIFEST_FILENAME = "run_manifest.json"
+RUN_MANIFEST_MAX_AGE = float(os.getenv("NEWSLETTER_RUN_MANIFEST_MAX_AGE_HOURS", "12")) * 3600
+PIPELINE_STAGES = ["scrape", "images", "upload", "write"]
+
+class RunManifest:
+    """Checkpoints of the direct and batch pipeline in run_manifest.json.
+
+    Each stage is recorded with a hash of its inputs (article URLs, settings and the output hashes of the stages
+    it depends on) and the hashes of the files it produced. A rerun skips a stage whose inputs and outputs are
+    unchanged and which finished less than NEWSLETTER_RUN_MANIFEST_MAX_AGE_HOURS ago (prices change), so it
+    resumes at the first stage that failed or is stale. A stage that failed for some articles only is recorded
+    as "incomplete" and runs again on the next run. `force_from` reruns that stage and all later ones.
+    """
+
+    def __init__(self, path: str = RUN_MANIFEST_FILENAME, force_from: str | None = None, max_age: float = RUN_MANIFEST_MAX_AGE):
+        if force_from is not None and force_from not in PIPELINE_STAGES:
+            raise ValueError(f"Unknown stage '{force_from}', expected one of {', '.join(PIPELINE_STAGES)}.")
+        self.path = path
+        self.force_from = force_from
+        self.max_age = max_age
+        self.stages = _load_json(path, {})
+
+    @staticmethod
+    def _output_hashes(paths: list[str]) -> dict:
+        return {path: _file_sha256(path) if os.path.exists(path) else None for path in paths}
+
+    def outputs_digest(self, key: str) -> str | None:
+        """A hash over the recorded outputs of a stage, used as input of the stages that depend on it."""
+        entry = self.stages.get(key)
+        if not entry or entry["status"] not in ("ok", "incomplete"):
+            return None
+        return hashlib.sha256(json.dumps(entry["outputs"], sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _forced(self, key: str) -> bool:
+        stage = key.split(":", 1)[0]
+        return self.force_from is not None and PIPELINE_STAGES.index(stage) >= PIPELINE_STAGES.index(self.force_from)
+
+    def _fresh(self, key: str, input_hash: str) -> bool:
+        entry = self.stages.get(key)
+        return (entry is not None and entry["status"] == "ok" and entry["input_hash"] == input_hash
+                and time.time() - entry["finished_at"] < self.max_age
+                and self._output_hashes(list(entry["outputs"])) == entry["outputs"])
+
+    def _save(self):
+        tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.stages, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    async def run(self, key: str, inputs: dict, run_stage, outputs, failures=None):
+        """Runs `run_stage()` (a coroutine function) unless the checkpoint of `key` is still valid.
+
+        `outputs(result)` names the files the stage produced. A stage fails if it raises, returns an "Error ..."
+        string or leaves an output missing. `failures(result)` lists the articles the stage failed for; if there
+        are any, the stage is not skipped next time. Returns the stage result, from the manifest when skipped.
+        """
+        input_hash = hashlib.sha256(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest()
+        if not self._forced(key) and self._fresh(key, input_hash):
+            print(f"  -> Stage '{key}' unchanged since {datetime.datetime.fromtimestamp(self.stages[key]['finished_at']):%d.%m.%Y %H:%M}, skipped.")
+            return self.stages[key]["result"]
+        started_at = time.time()
+        try:
+            result = await run_stage()
+            if isinstance(result, str) and result.startswith("Error"):
+                raise RuntimeError(result)
+            missing = [path for path in outputs(result) if not os.path.exists(path)]
+            if missing:
+                raise RuntimeError(f"Stage '{key}' did not produce {', '.join(missing)}")
+        except BaseException as e:
+            self.stages[key] = {"input_hash": input_hash, "status": "failed", "error": str(e), "started_at": started_at, "finished_at": time.time()}
+            self._save()
+            raise
+        failed = failures(result) if failures else []
+        self.stages[key] = {"input_hash": input_hash, "status": "incomplete" if failed else "ok", "outputs": self._output_hashes(outputs(result)), "result": result,
+                            "failed": failed, "started_at": started_at, "finished_at": time.time()}
+        self._save()
+        if failed:
+            print(f"  -> Stage '{key}' failed for {len(failed)} articles ({', '.join(failed)}); it runs again on the next run.")
+        return result
+
+def read_article_urls(article_list_content: str) -> list[str]:
+    """Returns the article URLs of an article list (one URL per line)."""
+    return [line.strip() for line in article_list_content.splitlines() if line.strip().startswith("http")]
+
+def writer_task(scraped_texts_filename: str = SCRAPED_TEXTS_FILENAME, image_urls_filename: str = IMAGE_URLS_FILENAME, base_filename: str = "Newsletter", streaming: bool = False) -> str:
+    """The writer's work order, shared by the coordinator prompt and the direct pipeline.
+
+    With `streaming`, the writer replies with the copy as JSON lines instead of saving it with a tool call.
+    """
+    if streaming:
+        save_step = """e. Do NOT call a tool to save it. Reply with the copy as JSON lines and nothing else: first one line {"intro": "...", "outro": "..."}, then one line per article in "needs_copy" with its fields ("url", "headline", ...). Each line is saved to the newsletter as soon as it arrives."""
+    else:
+        save_step = f"e. Save it by calling `save_newsletter_from_copy` with copy_json set to that JSON, scraped_texts_filename='{scraped_texts_filename}', image_urls_filename='{image_urls_filename}' and base_filename='{base_filename}'."
+    return f"""        a. Read instructions from '{INSTRUCTIONS_PATH}' (tone and content rules; the HTML layout, prices, units and image URLs are filled in automatically).
+        b. Call `get_articles_needing_copy` with scraped_texts_filename='{scraped_texts_filename}'. It returns the structured data of the articles that need new copy ("needs_copy") and the headlines of the articles whose copy is reused from the cache ("cached").
+        c. Use the current date: '{datetime.date.today().strftime('%d.%m.%Y')}'.
+        d. Write ONLY the newsletter copy as JSON: {COPY_SCHEMA}
+           "intro" is the text after the salutation, "outro" the closing wish (e.g. "Ich wünsche Ihnen eine schöne Adventszeit mit viel Genuss,"). Add one entry per article in "needs_copy" (the cached articles are added automatically): "price_label" names what the price refers to (e.g. "je Flasche", "je Karton mit 6 Gläsern"), "vat" is "7%" for food and "19%" otherwise, "rating" (optional) holds awards/ratings, "content_note" (optional) describes the contents when the data has no unit content. Use plain text, no HTML.
+        {save_step}"""
+
+async def run_agent(agent: "LlmAgent", prompt: str, session_id: str, on_text=None) -> str:
+    """Runs `agent` on `prompt` in a fresh session and returns the text of its replies.
+
+    With `on_text`, the model output is streamed and each piece of reply text is passed to on_text as it
+    arrives instead of being collected (the return value is then empty).
+    """
+    from google.adk.agents.run_config import RunConfig, StreamingMode
+    from google.adk.runners import Runner
+    from google.adk.sessions import InMemorySessionService
+    from google.genai import types
+
+    session_service = InMemorySessionService()
+    runner = Runner(agent=agent, app_name=APP_NAME, session_service=session_service)
+    session = await session_service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id=session_id)
+    print(f"✅ Session '{session.id}' created for {agent.name}.")
+
+    query = types.Content(role="user", parts=[types.Part(text=prompt)])
+    final_response = ""
+    run_config = RunConfig(streaming_mode=StreamingMode.SSE if on_text else StreamingMode.NONE)
+    streamed = False
+    async for event in runner.run_async(user_id=USER_ID, session_id=session.id, new_message=query, run_config=run_config):
+        if event.content and event.content.parts and hasattr(event.content.parts[0], 'text') and event.content.parts[0].text:
+            text = event.content.parts[0].text
+            if not on_text:
+                final_response += text
+            elif event.partial:
+                on_text(text)
+                streamed = True
+            elif not streamed:
+                # A model without streaming support sends the whole reply at once.
+                on_text(text)
+            if on_text and not event.partial:
+                # The final event of a streamed reply repeats the text of its partial events; it ends the reply's last line.
+                on_text("\n")
+                streamed = False
+    return final_response
+
+async def scrape_stage(manifest: RunManifest, article_urls: list[str], scraped_texts_filename: str = SCRAPED_TEXTS_FILENAME) -> str:
+    return await manifest.run("scrape", {"urls": article_urls},
+                              lambda: asyncio.to_thread(get_and_save_all_article_texts, article_urls, output_filename=scraped_texts_filename),
+                              outputs=lambda result: [scraped_texts_filename],
+                              failures=lambda result: [url for url, data in _load_json(scraped_texts_filename, {}).items() if "error" in data])
+
+async def images_stage(manifest: RunManifest, article_urls: list[str]) -> list[str]:
+    return await manifest.run("images", {"urls": article_urls, "settings": IMAGE_SETTINGS},
+                              lambda: asyncio.to_thread(process_images_from_urls, article_urls),
+                              outputs=lambda paths: [IMAGE_INDEX_FILENAME, *paths],
+                              failures=lambda paths: articles_without_image(article_urls))
+
+async def upload_stage(manifest: RunManifest, file_paths: list[str], image_urls_filename: str = IMAGE_URLS_FILENAME) -> str:
+    return await manifest.run("upload", {"images": manifest.outputs_digest("images"), "backend": UPLOAD_BACKEND, "shop": SHOPWARE_URL, "folder": SHOPWARE_MEDIA_FOLDER},
+                              lambda: upload_images_and_get_urls(file_paths, output_filename=image_urls_filename),
+                              outputs=lambda result: [image_urls_filename])
+
+async def prepare_articles(article_urls: list[str], scraped_texts_filename: str = SCRAPED_TEXTS_FILENAME, image_urls_filename: str = IMAGE_URLS_FILENAME, manifest: RunManifest | None = None):
+    """Scrapes the articles and processes/uploads their images; image processing -> upload runs concurrently with the scraping."""
+    manifest = manifest or RunManifest()
+
+    async def images_and_upload():
+        return await upload_stage(manifest, await images_stage(manifest, article_urls), image_urls_filename)
+
+    results = await asyncio.gather(images_and_upload(), scrape_stage(manifest, article_urls, scraped_texts_filename), return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+async def run_writer(scraped_texts_filename: str, image_urls_filename: str, base_filename: str = "Newsletter", session_id: str = "writer", writer: "LlmAgent | None" = None, streaming: bool = WRITER_STREAMING) -> str:
+    """Runs the NewsletterWriterAgent (or `writer`) on already scraped articles in its own session.
+
+    With `streaming`, the writer's reply is rendered into the newsletter file article by article while the
+    model is still writing (NEWSLETTER_WRITER_STREAMING=1).
+    """
+    # Fails before any model call if an article could not be scraped.
+    check_scraped_articles(_load_json(scraped_texts_filename, {}))
+    if not streaming:
+        writer_prompt = f"""Write the newsletter. Follow these steps:
+{writer_task(scraped_texts_filename, image_urls_filename, base_filename)}
+After saving, respond with a short confirmation message."""
+        return await run_agent(writer or get_writer_agent(), writer_prompt, session_id=session_id)
+
+    writer_prompt = f"""Write the newsletter. Follow these steps:
+{writer_task(scraped_texts_filename, image_urls_filename, base_filename, streaming=True)}"""
+    stream = NewsletterStreamWriter(scraped_texts_filename, image_urls_filename, base_filename)
+    try:
+        await run_agent(writer or get_streaming_writer_agent(), writer_prompt, session_id=session_id, on_text=stream.feed)
+        result = stream.close()
+    except BaseException:
+        stream.abort()
+        raise
+    return f"{result}. {validate_newsletter(stream.output_filename, scraped_texts_filename, image_urls_filename)}"
+
+async def write_stage(manifest: RunManifest, key: str, scraped_texts_filename: str, image_urls_filename: str, base_filename: str = "Newsletter", session_id: str = "writer", writer: "LlmAgent | None" = None) -> str:
+    """run_writer as a checkpointed stage: skipped if today's newsletter was already written from the same data."""
+    writer = writer or (get_streaming_writer_agent() if WRITER_STREAMING else get_writer_agent())
+    output_filename = newsletter_filename(base_filename)
+    inputs = {
+        "scraped": _file_sha256(scraped_texts_filename), "images": manifest.outputs_digest("upload"),
+        "template": _file_sha256(TEMPLATE_PATH), "instructions": _file_sha256(INSTRUCTIONS_PATH) if os.path.exists(INSTRUCTIONS_PATH) else None,
+        "model": str(getattr(writer.model, "model", writer.model)), "output": output_filename,
+    }
+
+    async def write():
+        started_at = time.time()
+        response = await run_writer(scraped_texts_filename, image_urls_filename, base_filename, session_id, writer)
+        if not os.path.exists(output_filename) or os.path.getmtime(output_filename) < started_at:
+            raise RuntimeError(f"The writer did not save {output_filename}: {response}")
+        return response
+
+    return await manifest.run(key, inputs, write, outputs=lambda result: [output_filename])
+
+async def run_pipeline_direct(article_urls: list[str], scraped_texts_filename: str = SCRAPED_TEXTS_FILENAME, image_urls_filename: str = IMAGE_URLS_FILENAME, writer: "LlmAgent | None" = None, manifest: RunManifest | None = None) -> str:
+    """Runs the pipeline as a fixed DAG in code; only the NewsletterWriterAgent (or `writer`) calls a model.
+
+    Stages whose checkpoint in `manifest` (default: run_manifest.json) is still valid are skipped.
+    """
+    manifest = manifest or RunManifest()
+    await prepare_articles(article_urls, scraped_texts_filename, image_urls_filename, manifest)
+    return await write_stage(manifest, "write", scraped_texts_filename, image_urls_filename, writer=writer)
+
+def edition_name(article_list_path: str) -> str:
+    """Edition name of an article list: its file name without extension ('Artikelliste_B2B.txt' -> 'Artikelliste_B2B')."""
+    return os.path.splitext(os.path.basename(article_list_path))[0]
+
+async def run_pipeline_batch(editions: dict[str, list[str]], scraped_texts_filename: str = SCRAPED_TEXTS_FILENAME, image_urls_filename: str = IMAGE_URLS_FILENAME, max_writers: int = WRITER_CONCURRENCY, writer: "LlmAgent | None" = None, manifest: RunManifest | None = None) -> dict:
+    """Builds one newsletter per edition ({name: article URLs}) in a single run.
+
+    Articles shared by several editions are scraped, processed and uploaded once (one uploader session for all
+    images). Each edition then gets its own subset of the scraped data and its own writer session; at most
+    `max_writers` writers run at the same time. Returns {edition: writer response or exception}.
+    """
+    all_urls = list(dict.fromkeys(url for urls in editions.values() for url in urls))
+    print(f"  -> {len(editions)} editions with {sum(len(urls) for urls in editions.values())} articles, {len(all_urls)} unique.")
+    manifest = manifest or RunManifest()
+    await prepare_articles(all_urls, scraped_texts_filename, image_urls_filename, manifest)
+    scraped = _load_json(scraped_texts_filename, {})
+
+    semaphore = asyncio.Semaphore(max_writers)
+    async def write_edition(name: str, urls: list[str]) -> str:
+        edition_filename = f"{os.path.splitext(scraped_texts_filename)[0]}_{name}.json"
+        with open(edition_filename, "w", encoding="utf-8") as f:
+            json.dump({url: scraped[url] for url in dict.fromkeys(urls) if url in scraped}, f, ensure_ascii=False, indent=2)
+        async with semaphore:
+            return await write_stage(manifest, f"write:{name}", edition_filename, image_urls_filename, base_filename=f"Newsletter_{name}", session_id=f"writer_{name}", writer=writer)
+
+    results = await asyncio.gather(*(write_edition(name, urls) for name, urls in editions.items()), return_exceptions=True)
+    return dict(zip(editions, results))
+
+async def run_stage_command(command: str, article_list_path: str = ARTICLE_LIST_PATH) -> str:
+    """Runs a single stage (CLI subcommands scrape, images, upload, write and validate), always recomputing that stage.
+
+    `upload` takes the images of the last `images` run (re-processing them only if that checkpoint is stale);
+    `write` works on the scraped texts and image URLs already on disk; `validate` re-checks today's newsletter
+    against the scraped texts (e.g. after it was edited by hand).
+    """
+    if command == "validate":
+        return validate_newsletter(newsletter_filename("Newsletter"), SCRAPED_TEXTS_FILENAME, IMAGE_URLS_FILENAME)
+    if command == "write":
+        missing = [path for path in (SCRAPED_TEXTS_FILENAME, IMAGE_URLS_FILENAME) if not os.path.exists(path)]
+        if missing:
+            return f"Error: {', '.join(missing)} not found; run the scrape, images and upload stages first."
+        return await write_stage(RunManifest(force_from=command), "write", SCRAPED_TEXTS_FILENAME, IMAGE_URLS_FILENAME)
+    manifest = RunManifest(force_from=command)
     article_list_content = read_file_content(article_list_path)
-    if not article_list_content:
+    if not article_list_content or article_list_content.startswith("Error reading file"):
+        return f"Error: Could not read article list from {article_list_path}."
+    article_urls = read_article_urls(article_list_content)
+    if command == "scrape":
+        return await scrape_stage(manifest, article_urls)
+    file_paths = await images_stage(manifest, article_urls)
+    if command == "images":
+        return "\n".join(file_paths)
+    return await upload_stage(manifest, file_paths)
+
+async def main(mode: str = "agent", article_list_paths: list[str] | None = None, from_stage: str | None = None):
+    if mode == "batch":
+        editions = {}
+        for path in article_list_paths or [ARTICLE_LIST_PATH]:
+            content = read_file_content(path)
+            if not content or content.startswith("Error reading file"):
+                print(f"Error: Could not read article list from {path}. Aborting.")
+                return
+            editions[edition_name(path)] = read_article_urls(content)
+        print(f"\n🚀 Starting batch newsletter generation for {len(editions)} editions...")
+        results = await run_pipeline_batch(editions, manifest=RunManifest(force_from=from_stage))
+        print("\n\n--- Writers' Final Reports ---")
+        for name, result in results.items():
+            print(f"{name}: {'Error: ' if isinstance(result, Exception) else ''}{result}")
+        return
+
+    article_list_path = (article_list_paths or [ARTICLE_LIST_PATH])[0]
+    article_list_content = read_file_content(article_list_path)
+    if not article_list_content or article_list_content.startswith("Error reading file"):
         print(f"Error: Could not read article list from {article_list_path}. Aborting.")
         return
 
+    if mode == "direct":
+        print("\n🚀 Starting direct newsletter generation (stages run in code, LLM only for writing)...")
+        final_response = await run_pipeline_direct(read_article_urls(article_list_content), manifest=RunManifest(force_from=from_stage))
+        print("\n\n--- Writer's Final Report ---")
+        print(final_response)
+        return
+
     master_prompt = f"""
     Your task is to coordinate your team of specialist agents to create a complete HTML newsletter. You MUST follow these steps in order.
 
@@ -226,19 +1858,14 @@ async def main():
     - Call your `ImageProcessingAgent` tool to process the images for the articles in the list below. It will return a list of local file paths.
 
     **Step 2: Upload Images**
-    - Take the list of file paths from Step 1 and call your `UploadAgent` tool to upload them and save the resulting public URLs to a file named '{image_urls_filename}'.
+    - Take the list of file paths from Step 1 and call your `UploadAgent` tool to upload them and save the resulting public URLs to a file named '{IMAGE_URLS_FILENAME}'.
 
     **Step 3: Scrape Article Texts**
-    - Call your `TextScrapingAgent` tool to scrape all article texts and save them to '{scraped_texts_filename}'.
+    - Call your `TextScrapingAgent` tool to scrape all article texts and save them to '{SCRAPED_TEXTS_FILENAME}'.
 
     **Step 4: Write the Newsletter**
     - Call your `NewsletterWriterAgent` tool. Your prompt to it MUST be a single, clear instruction that tells it to:
-        a. Read instructions from '{instructions_path}'.
-        b. Read the structured article data (including prices) from '{scraped_texts_filename}'.
-        c. Read the HTML example from '{html_example_path}'.
-        d. Read the public image URLs from '{image_urls_filename}'.
-        e. Use the current date: '{datetime.date.today().strftime('%d.%m.%Y')}'.
-        f. Generate the complete HTML, ensuring all prices, units, and price-per-unit values are 100% accurate based on the scraped data, and then save it to a file.
+{writer_task()}
 
     Your final response should be a short confirmation message.
 
@@ -249,28 +1876,59 @@ async def main():
     Begin the coordination process now.
     """
 
-    APP_NAME = "newsletter_app"
-    USER_ID = "user1"
-    SESSION_ID = "session1"
-    
-    session_service = InMemorySessionService()
-    runner = Runner(agent=coordinator_agent, app_name=APP_NAME, session_service=session_service)
-    print("✅ Runner and session service created.")
-
-    session = await session_service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID)
-    print(f"✅ Session '{session.id}' created.")
-
-    query = types.Content(role="user", parts=[types.Part(text=master_prompt)])
     print("\n🚀 Starting full end-to-end newsletter generation...")
-
-    final_response = ""
-    async for event in runner.run_async(user_id=USER_ID, session_id=session.id, new_message=query):
-        if event.content and event.content.parts and hasattr(event.content.parts[0], 'text') and event.content.parts[0].text:
-            final_response += event.content.parts[0].text
+    final_response = await run_agent(get_coordinator_agent(), master_prompt, session_id="session1")
 
     print("\n\n--- Coordinator's Final Report ---")
     print(final_response)
 
 
+def build_arg_parser() -> argparse.ArgumentParser:
+    """CLI: `all` (the default) runs the whole pipeline; scrape, images, upload, write and validate run a single stage."""
+    # Options may be given before or after the subcommand. The subcommand parsers use SUPPRESS defaults, so
+    # they do not reset an option that was given before the subcommand; article lists given after it are
+    # collected separately and added by parse_args. Each --article-list takes exactly one path, so a
+    # subcommand name is never read as a list.
+    def add_options(parser, run_options: bool, top_level: bool):
+        default = (lambda value: value) if top_level else (lambda value: argparse.SUPPRESS)
+        parser.add_argument("--article-list", "--article-lists", action="append", metavar="PATH", default=default(None), dest="article_lists" if top_level else "command_article_lists",
+                            help=f"article list to use, repeat for several (default: {ARTICLE_LIST_PATH}); batch mode creates one edition per list")
+        if run_options:
+            parser.add_argument("--mode", choices=["agent", "direct", "batch"], default=default(os.getenv("NEWSLETTER_MODE", "agent")),
+                                help="agent: the CoordinatorAgent orchestrates the tools; direct: the stages run in code and only the writer uses an LLM; batch: like direct, one newsletter per article list")
+            parser.add_argument("--from-stage", choices=PIPELINE_STAGES, default=default(None), help=f"direct/batch mode: rerun this stage and all later ones even if {RUN_MANIFEST_FILENAME} says they are up to date")
+
+    parser = argparse.ArgumentParser(description="Creates the Amadoro newsletter.")
+    add_options(parser, run_options=True, top_level=True)
+    commands = parser.add_subparsers(dest="command", metavar="{all,scrape,images,upload,write,validate}")
+    add_options(commands.add_parser("all", help="run the whole pipeline (default)"), run_options=True, top_level=False)
+    for command, help_text in (("scrape", f"scrape the article data into {SCRAPED_TEXTS_FILENAME}"), ("images", "download and resize the article images"),
+                               ("upload", f"upload the processed images and save their URLs to {IMAGE_URLS_FILENAME}"), ("write", "write the newsletter from the scraped data and image URLs on disk"),
+                               ("validate", f"check and fix prices and units in today's newsletter against {SCRAPED_TEXTS_FILENAME}")):
+        add_options(commands.add_parser(command, help=help_text), run_options=False, top_level=False)
+    return parser
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Parses the command line; rejects article lists that do not exist and several lists for a single stage."""
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    args.article_lists = (args.article_lists or []) + getattr(args, "command_article_lists", [])
+    missing = [path for path in args.article_lists if not os.path.isfile(path)]
+    if missing:
+        parser.error(f"article list not found: {', '.join(missing)}")
+    if args.command not in (None, "all") and len(args.article_lists) > 1:
+        parser.error(f"the {args.command} command takes one article list")
+    args.article_lists = args.article_lists or None
+    return args
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    args = parse_args()
+    command = args.command or "all"
+    run_trace.info.update({"command": command, "mode": args.mode})
+    try:
+        if command == "all":
+            asyncio.run(main(args.mode, args.article_lists, args.from_stage))
+        else:
+            print(asyncio.run(run_stage_command(command, (args.article_lists or [ARTICLE_LIST_PATH])[0])))
+    finally:
+        run_trace.write()
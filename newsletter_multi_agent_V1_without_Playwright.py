@@ -3,11 +3,9 @@ import asyncio
 import re
 import datetime
 import json
+import functools
 from dotenv import load_dotenv
 import requests
-from bs4 import BeautifulSoup
-from PIL import Image
-from io import BytesIO
 
 # --- Environment Setup ---
 dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
@@ -15,13 +13,7 @@ load_dotenv(dotenv_path=dotenv_path, override=True)
 print(f"INFO:     Lade .env-Datei von: {dotenv_path} (mit override=True)")
 
 # --- ADK Imports ---
-from google.adk.agents import LlmAgent
-from google.adk.models.google_llm import Gemini
-from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
-from google.adk.tools import AgentTool
-from google.genai import types
-print("✅ ADK components imported successfully.")
+# google.adk, google.genai and bs4 are imported where they are first needed, so importing this module is fast.
 
 # --- Tool Function Definitions ---
 def read_file_content(filepath: str) -> str:
@@ -37,6 +29,8 @@ def read_file_content(filepath: str) -> str:
 
 def get_and_save_all_article_texts(urls: list[str], output_filename: str = "scraped_texts.json") -> str:
     """Scrapes the main text from a list of URLs and saves them to a JSON file."""
+    from bs4 import BeautifulSoup
+
     print(f"TOOL CALLED: get_and_save_all_article_texts(..., output_filename='{output_filename}')")
     scraped_texts = {}
     for url in urls:
@@ -91,40 +85,48 @@ lite_model_name = "gemini-2.5-flash-lite"
 writer_model_name = "gemini-2.5-flash" 
 print(f"INFO:     Using models: '{lite_model_name}' (for specialists) and '{writer_model_name}' (for writer).")
 
-# --- Specialist Agents ---
-image_agent = LlmAgent(
-    name="ImageProcessingAgent",
-    model=Gemini(model=lite_model_name),
-    instruction="Your only job is to call the `process_images_from_urls` tool. CRITICAL: After the tool call, you MUST respond with a simple confirmation message like 'Image processing complete.'",
-    tools=[process_images_from_urls],
-)
-scraper_agent = LlmAgent(
-    name="TextScrapingAgent",
-    model=Gemini(model=lite_model_name),
-    instruction="Your only job is to call the `get_and_save_all_article_texts` tool. CRITICAL: After the tool call, you MUST respond with the filename where the texts were saved.",
-    tools=[get_and_save_all_article_texts],
-)
-# The writer agent gets a more capable model for its complex creative task
-writer_agent = LlmAgent(
-    name="NewsletterWriterAgent",
-    model=Gemini(model=writer_model_name),
-    instruction="You are an expert copywriter. Your job is to read the necessary files, generate a complete HTML newsletter, and then save it to a file using your tools. After saving, you MUST respond with a confirmation message.",
-    tools=[read_file_content, write_newsletter_to_file],
-)
-print("✅ Specialist agents defined.")
-
-# --- Coordinator Agent (The "Manager") ---
-coordinator_agent = LlmAgent(
-    name="CoordinatorAgent",
-    model=Gemini(model=lite_model_name), # Coordinator can use the lite model
-    instruction="You are the project manager. Your job is to coordinate a team of specialist agents to create a newsletter. You must call them in the correct order and pass the necessary information (like filenames) between them.",
-    tools=[
-        AgentTool(agent=image_agent),
-        AgentTool(agent=scraper_agent),
-        AgentTool(agent=writer_agent),
-    ],
-)
-print("✅ Coordinator agent defined.")
+@functools.cache
+def get_coordinator_agent():
+    """Builds the specialist agents and the coordinator on first use (only then is ADK imported)."""
+    from google.adk.agents import LlmAgent
+    from google.adk.models.google_llm import Gemini
+    from google.adk.tools import AgentTool
+
+    # --- Specialist Agents ---
+    image_agent = LlmAgent(
+        name="ImageProcessingAgent",
+        model=Gemini(model=lite_model_name),
+        instruction="Your only job is to call the `process_images_from_urls` tool. CRITICAL: After the tool call, you MUST respond with a simple confirmation message like 'Image processing complete.'",
+        tools=[process_images_from_urls],
+    )
+    scraper_agent = LlmAgent(
+        name="TextScrapingAgent",
+        model=Gemini(model=lite_model_name),
+        instruction="Your only job is to call the `get_and_save_all_article_texts` tool. CRITICAL: After the tool call, you MUST respond with the filename where the texts were saved.",
+        tools=[get_and_save_all_article_texts],
+    )
+    # The writer agent gets a more capable model for its complex creative task
+    writer_agent = LlmAgent(
+        name="NewsletterWriterAgent",
+        model=Gemini(model=writer_model_name),
+        instruction="You are an expert copywriter. Your job is to read the necessary files, generate a complete HTML newsletter, and then save it to a file using your tools. After saving, you MUST respond with a confirmation message.",
+        tools=[read_file_content, write_newsletter_to_file],
+    )
+    print("✅ Specialist agents defined.")
+
+    # --- Coordinator Agent (The "Manager") ---
+    coordinator_agent = LlmAgent(
+        name="CoordinatorAgent",
+        model=Gemini(model=lite_model_name), # Coordinator can use the lite model
+        instruction="You are the project manager. Your job is to coordinate a team of specialist agents to create a newsletter. You must call them in the correct order and pass the necessary information (like filenames) between them.",
+        tools=[
+            AgentTool(agent=image_agent),
+            AgentTool(agent=scraper_agent),
+            AgentTool(agent=writer_agent),
+        ],
+    )
+    print("✅ Coordinator agent defined.")
+    return coordinator_agent
 
 async def main():
     instructions_path = "C:/Users/chris/Documents/dev/Codriver/Newsletter-Instructions.txt"
@@ -173,8 +175,12 @@ async def main():
     USER_ID = "user1"
     SESSION_ID = "session1"
     
+    from google.adk.runners import Runner
+    from google.adk.sessions import InMemorySessionService
+    from google.genai import types
+
     session_service = InMemorySessionService()
-    runner = Runner(agent=coordinator_agent, app_name=APP_NAME, session_service=session_service)
+    runner = Runner(agent=get_coordinator_agent(), app_name=APP_NAME, session_service=session_service)
     print("✅ Runner and session service created.")
 
     session = await session_service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID)
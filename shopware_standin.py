@@ -0,0 +1,166 @@
+"""Local stand-in for the parts of the Shopware 6 Admin API used by ShopwareApiUploader.
+
+Implements OAuth token, media folder/media search, sync (media create and delete) and media upload, and serves the
+uploaded files under /media/. Everything is kept in memory. Use it to test and benchmark the API upload
+backend offline:
+
+    python shopware_standin.py --port 8765                 # serve; then SHOPWARE_URL=http://127.0.0.1:8765
+    python shopware_standin.py --benchmark 100             # upload 100 synthetic images and time it
+"""
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+class ShopwareStandin:
+    """In-memory media store behind the stand-in API."""
+
+    def __init__(self, base_url: str = "", latency: float = 0.0):
+        self.base_url = base_url
+        self.latency = latency
+        self.tokens = set()
+        self.folders = [{"id": uuid.uuid4().hex, "name": name} for name in ("Migration", "Aktionen")]
+        self.media = {}
+        self.files = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def _matches(self, media: dict, criteria_filter: dict) -> bool:
+        value = media.get(criteria_filter["field"])
+        if criteria_filter["type"] == "equals":
+            return value == criteria_filter["value"]
+        if criteria_filter["type"] == "equalsAny":
+            return value in criteria_filter["value"]
+        return True
+
+    def search(self, entities: list[dict], criteria: dict) -> dict:
+        found = [entity for entity in entities if all(self._matches(entity, f) for f in criteria.get("filter", []))]
+        found = found[:criteria.get("limit", len(found)) or len(found)]
+        return {"total": len(found), "data": found}
+
+    def upload(self, media_id: str, file_name: str, extension: str, data: bytes):
+        media = self.media[media_id]
+        uploaded_at = int(time.time())
+        path = f"media/{media_id[:2]}/{media_id[2:4]}/{uploaded_at}/{file_name}.{extension}"
+        media.update({"fileName": file_name, "fileExtension": extension, "url": f"{self.base_url}/{path}"})
+        self.files[path] = data
+
+def make_handler(store: ShopwareStandin):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, body=None, content_type: str = "application/json"):
+            data = b"" if body is None else (body if isinstance(body, bytes) else json.dumps(body).encode("utf-8"))
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        def _authorized(self) -> bool:
+            return self.headers.get("Authorization", "").removeprefix("Bearer ") in store.tokens
+
+        def do_GET(self):
+            path = urlsplit(self.path).path.lstrip("/")
+            if path in store.files:
+                return self._send(200, store.files[path], "image/jpeg")
+            self._send(404, {"errors": [{"detail": "Not found"}]})
+
+        def do_POST(self):
+            if store.latency:
+                time.sleep(store.latency)
+            url = urlsplit(self.path)
+            body = self._body()
+            with store.lock:
+                store.requests += 1
+                response = self._route(url, body)
+            self._send(*response)
+
+        def _route(self, url, body: bytes) -> tuple:
+            if url.path == "/api/oauth/token":
+                token = uuid.uuid4().hex
+                store.tokens.add(token)
+                return 200, {"token_type": "Bearer", "expires_in": 600, "access_token": token}
+            if not self._authorized():
+                return 401, {"errors": [{"status": "401", "title": "Unauthorized"}]}
+            if url.path == "/api/search/media-folder":
+                return 200, store.search(store.folders, json.loads(body or b"{}"))
+            if url.path == "/api/search/media":
+                return 200, store.search(list(store.media.values()), json.loads(body or b"{}"))
+            if url.path == "/api/_action/sync":
+                for operation in json.loads(body).values():
+                    for payload in operation["payload"]:
+                        if operation["action"] == "delete":
+                            store.media.pop(payload["id"], None)
+                        else:
+                            store.media[payload["id"]] = {"id": payload["id"], "mediaFolderId": payload.get("mediaFolderId"), "fileName": None, "url": ""}
+                return 200, {"success": True}
+            upload = re.fullmatch(r"/api/_action/media/([0-9a-f]{32})/upload", url.path)
+            if upload and upload.group(1) in store.media:
+                query = parse_qs(url.query)
+                store.upload(upload.group(1), query["fileName"][0], query["extension"][0], body)
+                return 204, None
+            return 404, {"errors": [{"detail": f"No route for {url.path}"}]}
+
+    return Handler
+
+def start_standin_server(port: int = 0, latency: float = 0.0) -> tuple[ThreadingHTTPServer, ShopwareStandin]:
+    """Starts the stand-in on a background thread; returns the server and its store (store.base_url is set)."""
+    store = ShopwareStandin(latency=latency)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(store))
+    server.daemon_threads = True
+    store.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, store
+
+def run_benchmark(count: int, latency: float, workers: int):
+    from PIL import Image
+    from newsletter_multi_agent import ShopwareApiUploader
+
+    server, store = start_standin_server(latency=latency)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(count):
+            path = os.path.join(tmp, f"article_{i:04d}_300.jpg")
+            Image.new("RGB", (300, 300), (i % 255, 80, 120)).save(path, "JPEG", quality=85)
+            paths.append(path)
+        uploader = ShopwareApiUploader(base_url=store.base_url, max_workers=workers, token_cache_path=os.path.join(tmp, "token.json"))
+        start = time.perf_counter()
+        urls = asyncio.run(uploader.upload(paths))
+        elapsed = time.perf_counter() - start
+    server.shutdown()
+    print(f"Uploaded {len(urls)} images in {elapsed:.2f}s ({len(urls) / elapsed:.1f} images/s, {store.requests} API requests, {workers} workers, {latency * 1000:.0f} ms latency)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated server latency per API request")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="upload N synthetic images through ShopwareApiUploader and exit")
+    parser.add_argument("--workers", type=int, default=8, help="upload concurrency for --benchmark")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        return run_benchmark(args.benchmark, args.latency_ms / 1000, args.workers)
+    server, store = start_standin_server(args.port, args.latency_ms / 1000)
+    print(f"Shopware stand-in listening on {store.base_url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    sys.exit(main())